@@ -290,8 +290,6 @@ for each_species in $SPECIES; do
     # If any of those is missing, download again
     if [[ ! -f $genome_file || ! -f $feature_file || ! -f $repeat_file ]]; then
         bash scripts/download_genomes.sh $each_species $genome_file $feature_file $repeat_file
-        # Clean non-nuclear
-        python3 scripts/keep_wanted_records.py $genome_file
     fi
     cd $go_back
     for each_window in $WINDOWS; do
@@ -19,6 +19,18 @@ SPECIES="h_sapiens m_musculus c_elegans d_melanogaster a_thaliana s_cerevisiae e
 FACTORS="CDS intron UTR RNA LCR TE tandem"
 all_factors="CDS_intron_UTR_RNA_LCR_TE_tandem"
 
+# Optional genome server: each genome is opened once, then served to all the snakemake calls below
+# (without it, each script directly reads the genome cache)
+use_genome_server=true
+if [[ $use_genome_server == true ]]; then
+    export GENOME_SERVER=$( pwd )/genome_server.sock
+    # Only the scripts of this analysis know the key of the server
+    export GENOME_SERVER_KEY=$( python3 -c "import secrets; print(secrets.token_hex(32))" )
+    python3 scripts/genome_server.py $GENOME_SERVER &
+    server_pid=$!
+    trap "kill $server_pid" EXIT
+fi
+
 
 ### First part: MDS of pure features ###
 
@@ -31,6 +43,7 @@ go_back=$( pwd )
 
 # The first part is to extract and clean factor ranges:
 for each_species in $SPECIES; do
+    species_factors=""
     for each_factor in $FACTORS; do
         # If feature = UTR, do not compute for S. cerevisiae and E. coli
         if [[ $each_factor == 'UTR' ]] && \
@@ -39,11 +52,13 @@ for each_species in $SPECIES; do
         elif [[ $each_factor == 'intron' && $each_species == 'e_coli' ]] ; then
             echo "$each_factor not computed for $each_species"
         else
-            # Finding factor ranges
-            snakemake $snakemake_arguments \
-                ../data/following/factor_proxies/$each_species/$each_factor\_proxies_done.txt
+            # This factor will be extracted along with the others
+            species_factors="$species_factors,$each_factor"
         fi
     done
+    # Finding the ranges of all the factors at once (each table of the species is only read once)
+    snakemake $snakemake_arguments \
+        ../data/following/factor_proxies/$each_species/${species_factors#,}\_proxies_done.txt
     # After finding all the factors' ranges, we must clean them from overlaps
     snakemake $snakemake_arguments \
         ../data/following/factor_filtered/$each_window/$each_species\_done.txt
@@ -159,6 +159,7 @@ go_back=$( pwd )
 
 # The first part is to extract and clean factor ranges:
 for each_species in $SPECIES; do
+    species_factors=""
     for each_factor in $FACTORS; do
         # If feature = UTR, do not compute for S. cerevisiae and E. coli
         if [[ $each_factor == 'UTR' ]] && \
@@ -167,11 +168,13 @@ for each_species in $SPECIES; do
         elif [[ $each_factor == 'intron' && $each_species == 'e_coli' ]] ; then
             echo "$each_factor not computed for $each_species"
         else
-            # Finding factor ranges
-            snakemake $snakemake_arguments \
-                ../data/following/factor_proxies/$each_species/$each_factor\_proxies_done.txt
+            # This factor will be extracted along with the others
+            species_factors="$species_factors,$each_factor"
         fi
     done
+    # Finding the ranges of all the factors at once (each table of the species is only read once)
+    snakemake $snakemake_arguments \
+        ../data/following/factor_proxies/$each_species/${species_factors#,}\_proxies_done.txt
     for each_window in $WINDOWS; do
         # After finding all the factors' ranges, we must clean them from overlaps
         snakemake $snakemake_arguments \
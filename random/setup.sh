@@ -235,17 +235,18 @@ for each_species in $SPECIES; do
     # If any of those is missing, download again
     if [[ ! -f $genome_file || ! -f $feature_file || ! -f $repeat_file ]]; then
         bash scripts/download_genomes.sh $each_species $genome_file $feature_file $repeat_file
-        # Clean of unwanted records
-        python3 scripts/keep_wanted_records.py $genome_file
     fi
     cd $go_back
 done
 
+# All the k-mer sizes are computed at once (e.g. 4,7)
+ALL_KMER=$( echo $KMER | tr ' ' ',' )
+
 for each_sample in $SAMPLE; do
     for each_window in $WINDOWS; do
+        python3 scripts/random_GS.py $each_sample $each_window $ALL_KMER $n_cores
         for each_kmer in $KMER; do
-            python3 scripts/random_GS.py $each_sample $each_window $each_kmer $n_cores
-            Rscript scripts/random_MDS.R
+            Rscript scripts/random_MDS.R temp/FCGRs_$each_kmer
         done
     done
 done
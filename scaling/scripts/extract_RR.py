@@ -2,11 +2,14 @@
 
 """Extract the percentage of windows' average recombination rate
 """
-from Bio import SeqIO
 import math
 import sys
 import os
 import subprocess
+# The shared functions are stored in the main scripts directory
+sys.path.append('../scripts')
+from genome_cache import open_genome, contains_unknown
+from window_manifest import read_windows, manifest_genome
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -14,7 +17,7 @@ __license__ = "MIT"
 
 # Wanted window size:
 window_size = int(sys.argv[1])
-# Species sample windows path:
+# Species sample windows path (window manifest, see window_manifest):
 species_sample = str(sys.argv[3])
 # Species abbreviation:
 species = '_'.join(str(species_sample.split('/')[-1]).split('_')[:2])
@@ -41,47 +44,34 @@ def checking_parent(file_path):
         pass
 
 
-###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
-# Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return records
-
-
 ###
 # Write a BED file containing the coordinates (first/last) of each windows not containing any N in them
-# Input:
-#   - records : fetched sequence (fasta) one wants the CGR computed on
+# Inputs:
+#   - windows : sample windows (see read_windows) one wants the recombination rate of
 #   - window_size : size of the sliding window
 #   - species_temp : path of the file which will be written on (removed at the end of the script)
 # Output:
 #   - A BED file, each row corresponds to a window, and on each row one can find the record ids and
 #       boundaries of the window.
 ###
-def all_coordinates_BED(records, window_size, species_temp):
+def all_coordinates_BED(windows, window_size, species_temp):
+    # The windows' coordinates are read straight from the manifest, and checked on the unknown runs of the genome
+    genome = open_genome(manifest_genome(species_sample))
+    entries = {entry.id: entry for entry in genome.records}
+
     with open(species_temp, 'w') as outfile:
-        for each_record in range(len(records)):
-            window_id = '_'.join([records[each_record].id.split('_')[0], records[each_record].id.split('_')[1]])
-            start = int(records[each_record].id.split('_')[2])
+        for window in windows:
+            record_id, start, _ = window.pieces[0]
             end = start + window_size
             # If any character in the sequence is NOT a standard nucleotides (including unknown nucleotides),
             # do NOT compute:
-            if not any([c not in 'ATCGatcg' for c in records[each_record].seq[start:end]]):
-                to_write = '\t'.join([window_id, str(start), str(end)])
+            if not contains_unknown(genome, entries[record_id], start, end):
+                to_write = '\t'.join([record_id, str(start), str(end)])
                 outfile.write(to_write + '\n')
 
 
-# Fetch all the records from this species fasta
-samples = fetch_fasta(species_sample)
+# The sample windows are read one at a time
+samples = read_windows(species_sample)
 
 all_coordinates_BED(samples, window_size, species_temp)
 
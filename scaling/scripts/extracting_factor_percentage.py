@@ -2,10 +2,14 @@
 
 """ Extracting percentage of nucleotides that are within the factor
 """
-from Bio import SeqIO
 import sys
 import os
 import numpy as np
+# The shared functions are stored in the main scripts directory
+sys.path.append('../scripts')
+from genome_cache import open_genome
+from window_manifest import read_windows
+from range_functions import range_store, build_factor_ranges, fetch_record_ranges, read_range_store
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -19,7 +23,7 @@ window_size = int(sys.argv[2])
 species_genome = str(sys.argv[3])
 # Species abbreviation:
 species = '_'.join(str(species_genome.split('/')[-1]).split('_')[:2])
-# Species sample windows path:
+# Species sample windows path (window manifest, see window_manifest):
 species_sample = str(sys.argv[4])
 # Output path:
 output = str(sys.argv[6])
@@ -41,36 +45,17 @@ def checking_parent(file_path):
 
 
 ###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
-# Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return (records)
-
-
-###
-# Build a numpy proxy record of factor using a files with the ranges of nucleotide within this factor + record length
+# Build a numpy proxy record of factor using the ranges of nucleotide within this factor + record length
+# (a record without ranges for this factor has no nucleotide within it)
 ###
 def build_proxy(record_ranges, record_length):
     # Each element of this list represents a nucleotide
     record_proxy = np.zeros(record_length, dtype=np.int8)
 
-    with open(record_ranges, 'r') as range_file:
-        for each_range in range_file:
-            start = int(each_range.split()[0])
-            end =  int(each_range.split()[1])
-
-            # For each nucleotide from start to end of the CDS:
-            for each_nucleotide in range(start, end):
-                record_proxy[each_nucleotide] = 1
+    if record_ranges is not None:
+        for start, end in record_ranges.tolist():
+            # For each nucleotide from start to end (both included) of the CDS:
+            record_proxy[start:end + 1] = 1
 
     record_proxy = np.asarray(record_proxy)
 
@@ -81,7 +66,7 @@ def build_proxy(record_ranges, record_length):
 # Extract the percentage of the sample windows nucleotides which are linked ot the wanted factor
 # Inputs:
 #   - record_proxy : proxy obtained through the build_proxy function
-#   - record_samples : all the sample sequences of this record
+#   - record_samples : all the sample windows of this record
 #   - window_size : size of the chosen window
 # Output:
 #   - List containing for each sample, the percentage of wanted factor
@@ -91,7 +76,7 @@ def extract_percentage (record_proxy, record_samples, window_size):
     record_percentages = list()
 
     for each_sample in record_samples:
-        window_start = int(each_sample.id.split('_')[2])
+        window_start = each_sample.pieces[0].start
         window_percentage = sum(record_proxy[window_start:window_start + window_size])
         record_percentages.append((window_percentage / window_size) * 100)
 
@@ -99,22 +84,22 @@ def extract_percentage (record_proxy, record_samples, window_size):
 
 
 # Fetch all the records from this species fasta
-records = fetch_fasta(species_genome)
-samples = fetch_fasta(species_sample)
+records = open_genome(species_genome).records
+samples = list(read_windows(species_sample))
 
-# Directory containing all the ranges in all the different files
-proxies_directory = '/'.join(['../files/factor_proxies', species, factor])
+# All the ranges of the wanted factor (none if the factor was not found in this species)
+factor_ranges = read_range_store(range_store(species), [factor]).get(factor, build_factor_ranges(list()))
 
 samples_percentages = list()
 for each_record in range(len(records)):
-    record_length = len(records[each_record].seq)
+    record_length = records[each_record].length
     record_id = records[each_record].id
-    record_ranges = proxies_directory + '/' + record_id
+    record_ranges = fetch_record_ranges(factor_ranges, record_id)
     # Build a proxy of record where 1 = nucleotide within factor ; 0 = nucleotide out of factor
     record_proxy = build_proxy(record_ranges, record_length)
 
     # Extracting all the samples from this record
-    record_samples = [each for each in samples if '_'.join(each.id.split('_')[0:2]) == record_id]
+    record_samples = [each for each in samples if each.pieces[0].record == record_id]
 
     # Check if not empty
     if record_samples:
@@ -1,14 +1,11 @@
 #!/usr/bin/env python3
 
-"""This script contain function built but not used directly in the analysis
+"""This script contain the functions shared by the analysis scripts (e.g. the CGR engine),
+as well as some function built but not used directly in the analysis
 """
-from Bio import SeqIO
-import sys
-import math
-import glob
 import os
+import functools
 import numpy
-from numpy import fft
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -30,6 +27,426 @@ def checking_parent(file_path):
         pass
 
 
+###
+# Lookup table translating any ASCII character into its CGR corner code
+# Nucleotide corner (x axis, y axis): A (0,0), C (0,1), T (1,0) and G (1,1), thus code = 2 * x + y
+# Any character which is not a standard nucleotide is marked as 255
+###
+nucleotide_table = numpy.full(256, 255, dtype=numpy.uint8)
+for each_nucleotide, each_code in zip('ACTG', range(4)):
+    nucleotide_table[ord(each_nucleotide)] = each_code
+    nucleotide_table[ord(each_nucleotide.lower())] = each_code
+
+# Number of bits of the integer CGR coordinates (see integer_CGR_coordinates)
+CGR_bits = 64
+# Maximum k-mer size, as a FCGR cell index (2 bits per nucleotide) must fit in a signed 64 bits integer: 2 * k < 64
+max_k_size = 31
+
+
+###
+# Translate a sequence into a numpy array of CGR corner codes (see nucleotide_table)
+# Inputs:
+#   - sequence : either a Bio.Seq, a string, a list of characters, bytes or a numpy array of ASCII codes
+#   - strict : whether or not (by default = True) we should raise an error on non standard nucleotides
+#       Note: if not strict, the non standard nucleotides are kept as 255
+# Output:
+#   - A numpy array (uint8) of corner codes
+###
+def nucleotide_codes(sequence, strict=True):
+    if isinstance(sequence, numpy.ndarray):
+        ascii_codes = sequence.astype(numpy.uint8, copy=False)
+    elif isinstance(sequence, (bytes, bytearray)):
+        ascii_codes = numpy.frombuffer(sequence, dtype=numpy.uint8)
+    else:
+        # Bio.Seq and strings are both translated through their string representation
+        if isinstance(sequence, list):
+            sequence = ''.join(sequence)
+        ascii_codes = numpy.frombuffer(str(sequence).encode('ascii'), dtype=numpy.uint8)
+
+    codes = nucleotide_table[ascii_codes]
+    if strict and numpy.any(codes == 255):
+        raise ValueError('Nucleotide not valid (not ATCG), may impede the rest of the analysis, please clean the '
+                         'sequence')
+    return codes
+
+
+###
+# Compute the Chaos Game Representation (CGR) of a sequence as exact fixed-point integers
+# Each coordinate is stored as coordinate * 2^64 in an uint64, where the most significant bit is the corner of the last
+# nucleotide, the next bit the corner of the nucleotide before, and so on: the grid cell of the last k nucleotides
+# is thus simply the k most significant bits, without any float rounding.
+# Input:
+#   - sequence : fetched sequence (fasta) one wants the CGR computed on
+# Output:
+#   - The coordinates stocked as [numpy array (uint64) of x coordinates, numpy array (uint64) of y coordinates]
+###
+def integer_CGR_coordinates(sequence):
+    codes = nucleotide_codes(sequence)
+    n_nucleotides = len(codes)
+
+    coordinates = list()
+    # Corner code = 2 * x + y
+    for each_corners in (codes >> 1, codes & 1):
+        integer_coordinates = each_corners.astype(numpy.uint64) << numpy.uint64(CGR_bits - 1)
+        # Each nucleotide go half-way to its corner = shift the previous coordinate by one bit and add its corner.
+        # Instead of walking the sequence, we can double the number of nucleotides taken into account at each step
+        # (1, 2, 4, ..., 64), which only needs 6 steps on the whole array
+        n_known = 1
+        while n_known < CGR_bits:
+            integer_coordinates[n_known:] |= integer_coordinates[:-n_known] >> numpy.uint64(n_known)
+            n_known *= 2
+
+        # Lastly add the starting position (0.5), as long as it is not shifted out of the 64 bits
+        n_start = min(n_nucleotides, CGR_bits - 1)
+        integer_coordinates[:n_start] |= \
+            numpy.uint64(1) << (numpy.uint64(CGR_bits - 2) - numpy.arange(n_start, dtype=numpy.uint64))
+        coordinates.append(integer_coordinates)
+
+    return coordinates
+
+
+###
+# Compute the Chaos Game Representation (CGR) of a sequence
+# Inputs:
+#   - records : fetched sequence (fasta) one wants the CGR computed on
+#   - outfile : path to the output file, which will contain the x/y CGR coordinates
+#           Note: if empty, will return the coordinates instead of writing a file.
+# Output:
+#   - Either a file, where each line contain a set of x/y coordinates (separated by \t)
+#   - Or the coordinates stocked as [numpy array of x coordinates, numpy array of y coordinates]
+# Performance :
+#   - Takes around 15 milliseconds for a 300'000 base pairs long sequence.
+###
+def CGR_coordinates(records, outfile):
+    # The float coordinates are the 53 most significant bits (float64 precision) of the integer coordinates
+    xcord, ycord = [numpy.ldexp((each >> numpy.uint64(CGR_bits - 53)).astype(numpy.float64), -53)
+                    for each in integer_CGR_coordinates(records)]
+
+    # If outfile is non-empty, write the output
+    if outfile:
+        checking_parent(outfile)
+        with open(outfile, 'w') as file:
+            file.writelines('%r\t%r\n' % each_xy for each_xy in zip(xcord.tolist(), ycord.tolist()))
+
+    # If no 2nd argument was given, outfile is empty (= considered False)
+    else:
+        # Store the CGR in a form of a list of numpy arrays
+        coordinates = [xcord, ycord]
+        return coordinates
+
+
+###
+# Sum the reverse complementary k-mer counts of a FCGR, the same way the FCGR_indexes function join their indexes:
+# cut the grid in 2, then join the columns to one another (first to last, second to last-1, and so on)
+# Note: works on a single FCGR, as well as on a matrix of FCGRs (one per line)
+###
+def halving_FCGR(FCGR, k_size):
+    mini_square = 2 ** k_size
+    grid = FCGR.reshape(FCGR.shape[:-1] + (mini_square, mini_square))
+    half = grid[..., :mini_square // 2, :] + grid[..., ::-1, :][..., :mini_square // 2, :]
+    return half.reshape(FCGR.shape[:-1] + (FCGR.shape[-1] // 2,))
+
+
+###
+# Find the index of FCGR cells once the reverse complementary k-mer counts are summed (see halving_FCGR)
+###
+def halving_cells(cells, k_size):
+    mini_square = 1 << k_size
+    column = cells >> k_size
+    column = numpy.where(column < mini_square // 2, column, mini_square - 1 - column)
+    return (column << k_size) | (cells & (mini_square - 1))
+
+
+###
+# Compute directly in which cell of the FCGR grid falls each k-mer of a sequence of corner codes
+# The column and line of each k-mer are rolled over the sequence, the last nucleotide being the most significant bit.
+# If halving, a k-mer whose column is in the second half of the grid (last nucleotide T or G) is counted with its
+# partner of the first half (same line, column mini_square - 1 - column, see FCGR_indexes): the cell index then
+# falls in a half-size grid, without ever building the full one
+# Inputs:
+#   - codes : numpy array of corner codes (see nucleotide_codes)
+#   - k_size : k-mer size (up to max_k_size)
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+# Output:
+#   - A numpy array (int64) of the len(codes) - k_size + 1 FCGR indexes (same order as the FCGR_indexes function)
+###
+def kmer_cells(codes, k_size, halving=False):
+    if not 1 <= k_size <= max_k_size:
+        raise ValueError('k-mer size must be between 1 and %d' % max_k_size)
+    n_kmers = len(codes) - k_size + 1
+    if n_kmers <= 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    # Corner code = 2 * x + y
+    x_bits = (codes >> 1).astype(numpy.int64)
+    y_bits = (codes & 1).astype(numpy.int64)
+    column = numpy.zeros(n_kmers, dtype=numpy.int64)
+    line = numpy.zeros(n_kmers, dtype=numpy.int64)
+    for each_position in range(k_size):
+        column |= x_bits[each_position:each_position + n_kmers] << each_position
+        line |= y_bits[each_position:each_position + n_kmers] << each_position
+
+    if halving:
+        # Flipping every bit of the column = mini_square - 1 - column
+        column ^= (column >> (k_size - 1)) * ((1 << k_size) - 1)
+
+    return (column << k_size) | line
+
+
+###
+# Count the k-mer Frequencies of the Chaos Game Representation (FCGR) directly from the corner codes
+# Inputs:
+#   - k_size : k-mer size
+#   - codes : numpy array of corner codes (see nucleotide_codes)
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+# Output:
+#   - The k-mer frequencies stocked as a numpy array, in the same order as the FCGR_indexes function
+###
+def FCGR_from_codes(k_size, codes, halving=False):
+    grid_size = 4 ** k_size
+    if halving:
+        grid_size //= 2
+    return numpy.bincount(kmer_cells(codes, k_size, halving), minlength=grid_size)
+
+
+###
+# Count the FCGRs of every k-mer size up to k_size from a single counting pass
+# Only the FCGR of the biggest k is counted: each smaller FCGR is the sum of the 2 x 2 blocks of cells of the next one
+# (i.e. forgetting the first nucleotide of each k-mer), to which we add the first k-mer of the sequence,
+# which is not the end of any bigger k-mer
+# Inputs:
+#   - k_size : biggest k-mer size
+#   - codes : numpy array of corner codes (see nucleotide_codes)
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+# Output:
+#   - A dictionary of the k-mer frequencies (numpy arrays, same order as the FCGR_indexes function) of each k-mer size
+###
+def FCGR_pyramid(k_size, codes, halving=False):
+    FCGR = FCGR_from_codes(k_size, codes)
+    all_FCGRs = {k_size: FCGR}
+    for each_k in range(k_size - 1, 0, -1):
+        # Cells are stored column after column: the first nucleotide is the least significant bit of both
+        mini_square = 1 << each_k
+        FCGR = FCGR.reshape(mini_square, 2, mini_square, 2).sum(axis=(1, 3)).ravel()
+        FCGR[kmer_cells(codes[:each_k], each_k)] += 1
+        all_FCGRs[each_k] = FCGR
+
+    if halving:
+        all_FCGRs = {each_k: halving_FCGR(all_FCGRs[each_k], each_k) for each_k in all_FCGRs}
+
+    return all_FCGRs
+
+
+###
+# Compute the FCGRs of all the (non-overlapping) windows of a sequence, in a single pass over the sequence
+# Inputs:
+#   - k_size : k-mer size
+#   - sequence : fetched sequence (fasta), e.g. a whole record of a genome
+#   - window_size : size of the windows
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+#   - chunk_size : number of windows counted at the same time (bounds the memory used for big records)
+# Output:
+#   - Yield, for each chunk of windows, a numpy array of the windows starts and the matrix of their FCGRs
+#       (one line per window, in the same order as the FCGR_indexes function)
+#       Note: as when sampling, the windows containing any non standard nucleotides are left out
+###
+def windows_FCGR_matrix(k_size, sequence, window_size, halving=False, chunk_size=256):
+    codes = nucleotide_codes(sequence, strict=False)
+    n_windows = len(codes) // window_size
+    grid_size = 4 ** k_size
+    if halving:
+        grid_size //= 2
+
+    # Only keep the k-mers which are fully within a window
+    in_window = numpy.arange(window_size * chunk_size) % window_size <= window_size - k_size
+
+    for first_window in range(0, n_windows, chunk_size):
+        chunk_n_windows = min(chunk_size, n_windows - first_window)
+        chunk = codes[first_window * window_size:(first_window + chunk_n_windows) * window_size]
+
+        # Windows with any unknown nucleotides are removed
+        unknown = chunk == 255
+        clean_windows = ~unknown.reshape(chunk_n_windows, window_size).any(axis=1)
+        chunk = numpy.where(unknown, 0, chunk)
+
+        # Each k-mer is counted in the FCGR of its window = line of the matrix
+        chunk_cells = kmer_cells(chunk, k_size, halving)
+        kmer_starts = numpy.flatnonzero(in_window[:len(chunk_cells)])
+        matrix_indexes = (kmer_starts // window_size) * grid_size + chunk_cells[kmer_starts]
+        matrix = numpy.bincount(matrix_indexes, minlength=chunk_n_windows * grid_size)
+        matrix = matrix.reshape(chunk_n_windows, grid_size)[clean_windows]
+
+        window_starts = (first_window + numpy.flatnonzero(clean_windows)) * window_size
+        yield window_starts, matrix
+
+
+###
+# Compute the FCGRs of overlapping windows sliding along a sequence, a chunk of windows at a time
+# Instead of counting each window from scratch, the counts are updated: the k-mers leaving the window are removed
+# and the k-mers entering it are added. These changes are counted for all the windows of a chunk at once (one bincount
+# per direction), then cumulated from the first window of the chunk, which only cost O(stride) per window
+# Inputs:
+#   - k_size : k-mer size
+#   - sequence : fetched sequence (fasta), e.g. a whole record of a genome
+#   - window_size : size of the windows
+#   - stride : number of nucleotides in between the start of two consecutive windows
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+#   - chunk_size : number of windows counted at the same time (bounds the memory used for big records)
+# Output:
+#   - Yield, for each window, its start and its FCGR (same order as the FCGR_indexes function)
+#       Note: as when sampling, the windows containing any non standard nucleotides are left out
+###
+def sliding_windows_FCGR(k_size, sequence, window_size, stride, halving=False, chunk_size=256):
+    if len(sequence) < window_size:
+        return
+    n_windows = (len(sequence) - window_size) // stride + 1
+    kmers_per_window = max(window_size - k_size + 1, 0)
+    grid_size = 4 ** k_size
+    if halving:
+        grid_size //= 2
+    # The k-mers with unknown nucleotides are sent to an extra cell, which is never reported
+    row_size = grid_size + 1
+
+    for first_window in range(0, n_windows, chunk_size):
+        chunk_n_windows = min(chunk_size, n_windows - first_window)
+        chunk_start = first_window * stride
+        window_starts = numpy.arange(chunk_n_windows, dtype=numpy.int64) * stride
+        codes = nucleotide_codes(sequence[chunk_start:chunk_start + int(window_starts[-1]) + window_size],
+                                 strict=False)
+
+        # Number of unknown nucleotides before each position, to find in O(1) whether a window/k-mer contain any
+        unknown = codes == 255
+        unknown_before = numpy.concatenate(([0], numpy.cumsum(unknown)))
+
+        # FCGR cell of each k-mer of the chunk
+        cells = kmer_cells(numpy.where(unknown, 0, codes), k_size, halving)
+        clean_kmers = unknown_before[k_size:] == unknown_before[:-k_size]
+        cells = numpy.where(clean_kmers, cells, grid_size)
+
+        if stride < kmers_per_window:
+            # The first window is counted, then the window j loses the k-mers [start - stride, start) and gains
+            # [start - stride + kmers_per_window, start + kmers_per_window), start being its own start
+            changes = numpy.zeros(chunk_n_windows * row_size, dtype=numpy.int64)
+            changes[:row_size] = numpy.bincount(cells[:kmers_per_window], minlength=row_size)
+            leaving = numpy.arange(window_starts[-1], dtype=numpy.int64)
+            rows = (leaving // stride + 1) * row_size
+            changes += numpy.bincount(rows + cells[leaving + kmers_per_window], minlength=len(changes))
+            changes -= numpy.bincount(rows + cells[leaving], minlength=len(changes))
+            matrix = changes.reshape(chunk_n_windows, row_size)
+            # Cumulated line after line (faster than along the columns of the whole matrix)
+            for each_window in range(1, chunk_n_windows):
+                matrix[each_window] += matrix[each_window - 1]
+        else:
+            # The windows do not overlap: each of them is simply counted
+            kmer_starts = (window_starts[:, numpy.newaxis] + numpy.arange(kmers_per_window)).ravel()
+            rows = numpy.repeat(numpy.arange(chunk_n_windows, dtype=numpy.int64) * row_size, kmers_per_window)
+            matrix = numpy.bincount(rows + cells[kmer_starts], minlength=chunk_n_windows * row_size)
+            matrix = matrix.reshape(chunk_n_windows, row_size)
+
+        clean_windows = unknown_before[window_starts + window_size] == unknown_before[window_starts]
+        for each_window in numpy.flatnonzero(clean_windows).tolist():
+            yield chunk_start + int(window_starts[each_window]), matrix[each_window, :grid_size]
+
+
+###
+# Compute the k-mer Frequencies using the Chaos Game Representation (FCGR)
+# Each CGR coordinate is in the half of the picture of the corner of its last nucleotide:
+# we can thus read back the nucleotides from the coordinates, and count the k-mers without sorting anything
+# Inputs:
+#   - k_size : k-mer size
+#   - CGR :
+#       - Either a file (string)
+#       - Or a set a of coordinates (list) obtained through CGR_coordinates function
+#   - outfile : path to the output file, which will contain the FCGR
+#           Note: if empty, will return the FCGR instead of writing a file.
+#   - halving: whether or not (by default = False) we should sum the reverse complementary kmer counts
+# Output:
+#   - Either a file, where each k-mer frequencies are separated by \t
+#   - Or the k-mer frequencies stocked as a numpy array
+###
+def FCGR_from_CGR(k_size, CGR, outfile, halving=False):
+    # If CGR is a string, it must be a path leading to a file containing all the coordinates
+    if isinstance(CGR, str):
+        with open(CGR, 'r') as CGR_file:
+            coordinates = numpy.array(CGR_file.read().split(), dtype=numpy.float64).reshape(-1, 2).T
+    # Else it's a Python list of coordinates
+    else:
+        coordinates = [numpy.asarray(CGR[0]), numpy.asarray(CGR[1])]
+
+    # Corner code = 2 * x + y, where x (or y) is 1 when in the right (or upper) half of the picture
+    codes = ((coordinates[0] >= 0.5).astype(numpy.uint8) << 1) | (coordinates[1] >= 0.5).astype(numpy.uint8)
+
+    FCGR = FCGR_from_codes(k_size, codes, halving)
+
+    # If outfile is non-empty, write the output
+    if outfile:
+        checking_parent(outfile)
+        with open(outfile, 'w') as file:
+            file.write('\t'.join(map(str, FCGR.tolist())) + '\t\n')
+    return FCGR
+
+
+# Directory where the FCGR indexes (see FCGR_index_arrays) are stored once computed, with the other generated files
+index_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'FCGR_indexes')
+
+
+###
+# Compute the k-mer label of each FCGR cell
+# The labels are computed once per k-mer size and stored in index_directory, then simply loaded (and kept in memory)
+# for any later call.
+# Inputs:
+#   - k_size : k-mer size
+#   - halving: whether or not (by default = False) we want the indexes of the sum of the reverse complementary kmer
+# Output:
+#   - A dictionary of read-only numpy arrays:
+#       - 'labels' : k-mer label of each FCGR cell (if halving, both k-mers separated by /)
+###
+@functools.lru_cache(maxsize=None)
+def FCGR_index_arrays(k_size, halving=False):
+    index_file = os.path.join(index_directory, '_'.join([str(k_size), 'halved' if halving else 'full']) + '.npz')
+    try:
+        with numpy.load(index_file) as stored:
+            arrays = {each_array: stored[each_array] for each_array in stored.files}
+    except (OSError, ValueError):
+        arrays = compute_FCGR_index_arrays(k_size, halving)
+        # Written aside then renamed, as other processes may read or write the same file at the same time
+        try:
+            os.makedirs(index_directory, exist_ok=True)
+            temporary_file = index_file + '.' + str(os.getpid()) + '.npz'
+            numpy.savez(temporary_file, **arrays)
+            os.replace(temporary_file, index_file)
+        except OSError:
+            pass
+
+    for each_array in arrays.values():
+        each_array.setflags(write=False)
+    return arrays
+
+
+###
+# Compute the tables of FCGR_index_arrays (see there)
+###
+def compute_FCGR_index_arrays(k_size, halving=False):
+    mini_square = 1 << k_size
+    cells = numpy.arange(4 ** k_size, dtype=numpy.int64)
+    column = cells >> k_size
+    line = cells & (mini_square - 1)
+
+    # Nucleotide j of a k-mer is given by the j-th bit of both its column (x) and line (y)
+    corner_codes = numpy.zeros((len(cells), k_size), dtype=numpy.int64)
+    for each_position in range(k_size):
+        corner_codes[:, each_position] = 2 * ((column >> each_position) & 1) + ((line >> each_position) & 1)
+    labels = numpy.ascontiguousarray(numpy.array(['A', 'C', 'T', 'G'])[corner_codes]).view('U' + str(k_size)).ravel()
+
+    if halving:
+        # The first half of the grid is kept, each cell being joined with the cell of the same line
+        # in the column mini_square - 1 - column (see halving_FCGR)
+        half = cells[:len(cells) // 2]
+        partner = ((mini_square - 1 - (half >> k_size)) << k_size) | (half & (mini_square - 1))
+        labels = numpy.char.add(numpy.char.add(labels[half], '/'), labels[partner])
+
+    return {'labels': labels}
+
+
 ###
 # Compute the indexes of the k-mer Frequencies of the Chaos Game Representation (FCGR)
 # Inputs:
@@ -39,90 +456,7 @@ def checking_parent(file_path):
 #   - The k-mer indexes (length(indexes) = all possible k-mer)
 ###
 def FCGR_indexes(k_size, halving = False):
-    # Get the indexes for this specific k-mer size
-    # Will take advantage of the fact that dividing the picture in grid yield mini tetramer square of indexes:
-    # Basically, a grid in an odd column and odd line yields a A (0,0), odd column and even line yields a C (0,1),
-    # even column and odd line yields a T (1,0) and even column and even line yields a G (1,1)
-    # First, we see what is the maximum number of mini-square we have in the picture
-    grid_size = int(math.pow(4, k_size))
-    mini_square = int(math.sqrt(grid_size))
-    grid_indexes = []
-    # For each k-mer size, find the indexes
-    for each_size in range(k_size):
-        # As python range begin at 0, must +1 to get to real k-mer size
-        each_size += 1
-        # actual_grid_index will contain all the indexes for this k-mer size
-        actual_grid_index = [''] * grid_size
-        # This pointer will track movement on the grid
-        grid_pointer = 0
-        # This will give us the number of grid for this size,
-        # which is used to find the number of mini-squares for this size
-        actual_grid_size = int(math.pow(4, each_size))
-        actual_mini_square = int(math.sqrt(actual_grid_size))
-        # multiplier will help use reach the max ammount of grid whenever we are at < size than max k-mer size
-        # Note: multiplying by 1 whenever we are at same size than max k-mer size
-        multiplier = mini_square / actual_mini_square
-        # We have to tweak the column/lines to make it works whenever we are at < size than max k-mer size
-        actual_lines = []
-        actual_column = []
-        # This part will thus only change line/column whenever we are at < size than max k-mer size
-        for each_mini_square in range(actual_mini_square):
-            multiplied_line = [each_mini_square] * int(multiplier)
-            multiplied_column = [each_mini_square] * int(multiplier)
-            for each_new_line in multiplied_line:
-                actual_lines.append(each_new_line)
-            for each_new_column in multiplied_column:
-                actual_column.append(each_new_column)
-
-        # Now can see whether odd/even column and stock the indexes for this size
-        for each_column in actual_column:
-            if not (each_column + 1) % 2 == 0:
-                for each_line in actual_lines:
-                    if not (each_line + 1) % 2 == 0:
-                        actual_grid_index[grid_pointer] = 'A'
-                        grid_pointer += 1
-                    else:
-                        actual_grid_index[grid_pointer] = 'C'
-                        grid_pointer += 1
-            else:
-                for each_line in actual_lines:
-                    if not (each_line + 1) % 2 == 0:
-                        actual_grid_index[grid_pointer] = 'T'
-                        grid_pointer += 1
-                    else:
-                        actual_grid_index[grid_pointer] = 'G'
-                        grid_pointer += 1
-        grid_indexes.append(actual_grid_index)
-
-    # Lastly, we now have k lists of indexes, which we must join to have the real index per grid
-    indexes = []
-    # If k = 1, we don't have to go list by list (only one list of index)
-    if len(grid_indexes) > 1:
-        for each_index_grid in range(len(grid_indexes[0])):
-            single_index = []
-            for each_index_size in reversed(range(len(grid_indexes))):
-                single_index.append(grid_indexes[each_index_size][each_index_grid])
-            indexes.append(''.join(single_index))
-    else:
-        indexes = grid_indexes[0]
-
-    if halving:
-        # To have reverse complementary kmer joined, we must kind of cut the vector in 2, then join the right column
-        # to one another (first to last, second to last-1, and so on)
-        cut_indexes = list()
-        for each_half_column in range(int(mini_square / 2)):
-            positive_strand_start = each_half_column * mini_square
-            positive_strand_end = positive_strand_start + mini_square
-            positive_indexes = indexes[positive_strand_start:positive_strand_end]
-            negative_strand_start = ((mini_square - each_half_column) - 1) * mini_square
-            negative_strand_end = negative_strand_start + mini_square
-            negative_indexes = indexes[negative_strand_start:negative_strand_end]
-
-            cut_indexes.extend(['/'.join(x) for x in zip(*[positive_indexes, negative_indexes])])
-
-        indexes = cut_indexes
-
-    return indexes
+    return FCGR_index_arrays(k_size, halving)['labels'].tolist()
 
 
 ###
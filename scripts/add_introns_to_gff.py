@@ -4,6 +4,7 @@
 """
 import sys
 import os
+from compressed_files import open_input
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -34,6 +35,7 @@ def checking_parent(file_path):
 # Add the introns in between exons in a gff file
 # Inputs:
 #   - species_table : path to the gff file of features (tested only on NCBI assemblies gff files)
+#       Note: may be gzip or BGZF compressed
 #   - *_column : column number when separating feature line by \t
 #   - outfile : path to the output file
 # Output: gff file + the introns
@@ -42,7 +44,7 @@ def adding_introns(species_table, output, feature_column, strand_column, start_c
     # Checking parent directory of output are present
     checking_parent(output)
 
-    with open(species_table, 'r') as feature_table, open(output, 'w') as outfile:
+    with open_input(species_table, 'r') as feature_table, open(output, 'w') as outfile:
         for each_line in feature_table:
             actual_line = each_line.split('\t')
             # We will use the fact that there is no \t in the comments to detect them
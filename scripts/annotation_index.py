@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions to index the annotation tables of a species (RepeatMasker output, feature table
+or gff file): where the lines of each record (seqid) are in the table, so that the lines of a record are directly read,
+wherever they are in the table (e.g. UTR lines placed after the end of their record)
+"""
+import os
+from compressed_files import open_input
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# Internal structure of each type of table: (id_column, feature_column, start_column, end_column)
+table_columns = {'repeats': (4, 10, 5, 6),
+                 'features': (6, 0, 7, 8),
+                 'genes': (0, 2, 3, 4)}
+
+
+###
+# Split a line of a table into its columns (RepeatMasker output are separated by spaces, the others by \t)
+###
+def split_line(table_type, line):
+    if table_type == 'repeats':
+        return line.rsplit()
+    # Same for features or genes
+    else:
+        return line.split('\t')
+
+
+###
+# Find where the lines of a table start, after its header (which differs in between the types of tables)
+# Inputs:
+#   - table_type : either repeats, features or genes
+#   - table : the table, opened in binary mode
+# Output:
+#   - The position (in bytes, once decompressed) of the first line after the header
+###
+def skip_header(table_type, table):
+    # RepeatMasker output always have 3 header lines
+    if table_type == 'repeats':
+        for _ in range(3):
+            table.readline()
+        return table.tell()
+
+    # Must skip the headers (varying length)
+    position = table.tell()
+    line = table.readline()
+    while line.startswith(b'#'):
+        position = table.tell()
+        line = table.readline()
+    return position
+
+
+###
+# Build the index of an annotation table, in a single pass: the runs of consecutive lines of each record
+# Inputs:
+#   - table_file : path to the table
+#           Note: may be gzip or BGZF compressed
+#   - table_type : either repeats, features or genes
+# Output:
+#   - A dictionary with, for each record id, a list of (start, end) positions (in bytes, once decompressed) of the
+#       runs of its lines, in the order of the table
+#       Note: the commentaries stay in the run they are found in
+###
+def build_annotation_index(table_file, table_type):
+    id_column = table_columns[table_type][0]
+    index = dict()
+
+    with open_input(table_file, 'rb') as table:
+        position = skip_header(table_type, table)
+        table.seek(position)
+
+        current_id = None
+        for line in table:
+            actual_line = split_line(table_type, line.decode())
+            # Commentaries have a single column (no record id)
+            if len(actual_line) > max(id_column, 1) and actual_line[id_column] != current_id:
+                if current_id is not None:
+                    index.setdefault(current_id, list()).append((run_start, position))
+                current_id = actual_line[id_column]
+                run_start = position
+            position += len(line)
+
+        if current_id is not None:
+            index.setdefault(current_id, list()).append((run_start, position))
+    return index
+
+
+###
+# Fetch the index of an annotation table, stored next to it (table_file.seqids, a tab-separated file of the record id,
+# start and end of each run of lines)
+# The index is only built if it does not exist yet, or if the table changed since
+# Inputs:
+#   - table_file : path to the table
+#   - table_type : either repeats, features or genes
+# Output:
+#   - A dictionary with, for each record id, a list of (start, end) of the runs of its lines
+#       (see build_annotation_index)
+###
+def fetch_annotation_index(table_file, table_type):
+    index_file = table_file + '.seqids'
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(table_file):
+        index = dict()
+        with open(index_file, 'r') as stored_index:
+            for each_line in stored_index:
+                record_id, start, end = each_line.rstrip('\n').split('\t')
+                index.setdefault(record_id, list()).append((int(start), int(end)))
+        return index
+
+    index = build_annotation_index(table_file, table_type)
+
+    # Written aside then renamed, as other processes may read or write the same file at the same time
+    try:
+        temporary_file = index_file + '.' + str(os.getpid())
+        with open(temporary_file, 'w') as stored_index:
+            for record_id, runs in index.items():
+                for start, end in runs:
+                    stored_index.write('\t'.join([record_id, str(start), str(end)]) + '\n')
+        os.replace(temporary_file, index_file)
+    except OSError:
+        pass
+    return index
+
+
+###
+# Read the lines of several records from an annotation table, run by run in the order of the table (whichever record
+# they belong to), so that the table is only read forward, even when the runs of the records are interleaved
+# Note: a gzip (not BGZF) table could only go back by decompressing it again from its start
+# Inputs:
+#   - table : the table, opened in binary mode (see open_input)
+#   - index : the runs of lines of each record (see fetch_annotation_index)
+#   - record_ids : list of the wanted record ids
+# Output:
+#   - Yield (record_id, lines) for each run, lines yielding each line (as a string) of the run
+#       Note: the lines of a run must be read before moving to the next run
+###
+def read_record_lines(table, index, record_ids):
+    runs = sorted([(start, end, record_id) for record_id in set(record_ids) for start, end in index.get(record_id, [])])
+    for start, end, record_id in runs:
+        yield record_id, read_run_lines(table, start, end)
+
+
+###
+# Read the lines of a run, in between two positions (in bytes, once decompressed) of a table
+###
+def read_run_lines(table, start, end):
+    if table.tell() != start:
+        table.seek(start)
+    position = start
+    while position < end:
+        line = table.readline()
+        position += len(line)
+        yield line.decode()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+"""This script convert a genome into its 2-bit packed cache (see genome_cache), once and for all after its download
+"""
+import sys
+from genome_cache import fetch_genome_cache
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Species genome path:
+species_genome = str(sys.argv[1])
+
+# The cache is only built if it is missing or older than the genome
+fetch_genome_cache(species_genome)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions to read the input files of the analysis (genomes, feature tables), whether
+they are plain, gzip or BGZF (block gzip, as written by bgzip) compressed files
+The BGZF blocks are decompressed by parallel threads, and can be directly reached through their index
+"""
+import os
+import io
+import gzip
+import zlib
+import struct
+import bisect
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# First bytes of any gzip (and thus BGZF) file
+gzip_magic = b'\x1f\x8b'
+
+# Number of BGZF blocks (at most 64 kb each once decompressed) decompressed at once by a thread
+blocks_per_task = 64
+
+# Encoding of the text files (whether compressed or not), whatever the locale
+text_encoding = 'utf-8'
+
+
+###
+# Find how a file is compressed, from its first bytes (whatever its extension)
+# Output:
+#   - Either 'plain', 'gzip' or 'bgzf'
+###
+def compression_type(file_path):
+    with open(file_path, 'rb') as file:
+        header = file.read(18)
+    if header[:2] != gzip_magic:
+        return 'plain'
+    # BGZF blocks are gzip members with an extra field (flag 4) of id 'BC', giving the size of the block
+    if len(header) == 18 and header[3] & 4 and header[12:14] == b'BC':
+        return 'bgzf'
+    return 'gzip'
+
+
+###
+# Build the index of a BGZF file: where each block starts, in the file and once decompressed
+# Only the headers and the last bytes (decompressed size) of each block are read
+# Input:
+#   - file_path : path to the BGZF file
+# Output:
+#   - A list of (compressed_offset, uncompressed_offset) of each block, plus the end of the file
+###
+def build_bgzf_index(file_path):
+    index = list()
+    compressed_offset = 0
+    uncompressed_offset = 0
+    file_size = os.path.getsize(file_path)
+
+    with open(file_path, 'rb') as bgzf:
+        while compressed_offset < file_size:
+            index.append((compressed_offset, uncompressed_offset))
+            bgzf.seek(compressed_offset)
+            header = bgzf.read(18)
+            if header[:2] != gzip_magic or header[12:14] != b'BC':
+                raise ValueError('%s is not a valid BGZF file (block at byte %d)' % (file_path, compressed_offset))
+            block_size = struct.unpack('<H', header[16:18])[0] + 1
+            bgzf.seek(compressed_offset + block_size - 4)
+            uncompressed_offset += struct.unpack('<I', bgzf.read(4))[0]
+            compressed_offset += block_size
+
+    index.append((compressed_offset, uncompressed_offset))
+    return index
+
+
+###
+# Fetch the index of a BGZF file, stored next to it (file_path.gzi, the same format as bgzip -i)
+# The index is only built if it does not exist yet, or if the file changed since
+# Input:
+#   - file_path : path to the BGZF file
+# Output:
+#   - A list of (compressed_offset, uncompressed_offset) of each block, plus the end of the file
+###
+def fetch_bgzf_index(file_path):
+    index_file = file_path + '.gzi'
+    try:
+        if os.path.getmtime(index_file) >= os.path.getmtime(file_path):
+            with open(index_file, 'rb') as stored_index:
+                n_blocks = struct.unpack('<Q', stored_index.read(8))[0]
+                offsets = struct.unpack('<%dQ' % (2 * n_blocks), stored_index.read(16 * n_blocks))
+            # The .gzi file does not store the first block, nor the end of the file
+            index = [(0, 0)] + list(zip(offsets[0::2], offsets[1::2]))
+            # The size of the last block is still needed to know where the file ends
+            with open(file_path, 'rb') as bgzf:
+                bgzf.seek(index[-1][0] + 16)
+                last_block_size = struct.unpack('<H', bgzf.read(2))[0] + 1
+                bgzf.seek(index[-1][0] + last_block_size - 4)
+                index.append((index[-1][0] + last_block_size,
+                              index[-1][1] + struct.unpack('<I', bgzf.read(4))[0]))
+            return index
+    except (OSError, struct.error):
+        pass
+
+    index = build_bgzf_index(file_path)
+
+    # Written aside then renamed, as other processes may read or write the same file at the same time
+    try:
+        temporary_file = index_file + '.' + str(os.getpid())
+        with open(temporary_file, 'wb') as stored_index:
+            stored_index.write(struct.pack('<Q', len(index) - 2))
+            for compressed_offset, uncompressed_offset in index[1:-1]:
+                stored_index.write(struct.pack('<QQ', compressed_offset, uncompressed_offset))
+        os.replace(temporary_file, index_file)
+    except OSError:
+        pass
+    return index
+
+
+###
+# Decompress a series of consecutive BGZF blocks (each of them being a complete gzip member)
+# Inputs:
+#   - compressed : bytes of the blocks
+#   - block_ends : end of each block in these bytes
+###
+def decompress_blocks(compressed, block_ends):
+    pieces = list()
+    block_start = 0
+    for block_end in block_ends:
+        pieces.append(zlib.decompress(compressed[block_start:block_end], 31))
+        block_start = block_end
+    return b''.join(pieces)
+
+
+###
+# Read a BGZF file as if it was not compressed
+# The next groups of blocks are decompressed in advance by parallel threads (zlib release the GIL), while the
+# current one is being read, and seeking directly jumps to the right block thanks to the index
+###
+class BGZFReader(io.RawIOBase):
+    def __init__(self, file_path, n_threads=None):
+        super().__init__()
+        self.file = open(file_path, 'rb')
+        index = fetch_bgzf_index(file_path)
+        self.compressed_offsets = [each[0] for each in index]
+        self.uncompressed_offsets = [each[1] for each in index]
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(self.n_threads)
+        self.pending = collections.deque()
+        self.buffer_start = 0
+        self.buffer = b''
+        self.seek(0)
+
+    ###
+    # Send the next group of blocks to be decompressed by a thread
+    ###
+    def submit_next(self):
+        if self.next_block >= len(self.compressed_offsets) - 1:
+            return
+        last_block = min(self.next_block + blocks_per_task, len(self.compressed_offsets) - 1)
+        first_byte = self.compressed_offsets[self.next_block]
+        self.file.seek(first_byte)
+        compressed = self.file.read(self.compressed_offsets[last_block] - first_byte)
+        block_ends = [each - first_byte for each in self.compressed_offsets[self.next_block + 1:last_block + 1]]
+        self.pending.append((self.uncompressed_offsets[self.next_block],
+                             self.executor.submit(decompress_blocks, compressed, block_ends)))
+        self.next_block = last_block
+
+    ###
+    # Move to the next group of decompressed blocks, keeping the threads busy with the following ones
+    ###
+    def next_buffer(self):
+        if not self.pending:
+            return False
+        self.buffer_start, future = self.pending.popleft()
+        self.buffer = future.result()
+        self.buffer_position = 0
+        while len(self.pending) < 2 * self.n_threads and self.next_block < len(self.compressed_offsets) - 1:
+            self.submit_next()
+        return True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, output):
+        while self.buffer_position >= len(self.buffer):
+            if not self.next_buffer():
+                return 0
+        n_bytes = min(len(output), len(self.buffer) - self.buffer_position)
+        output[:n_bytes] = self.buffer[self.buffer_position:self.buffer_position + n_bytes]
+        self.buffer_position += n_bytes
+        return n_bytes
+
+    def tell(self):
+        return self.buffer_start + self.buffer_position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence == io.SEEK_END:
+            offset += self.uncompressed_offsets[-1]
+        offset = max(offset, 0)
+
+        # Within the current group, the groups decompressed in advance are still the next ones
+        if self.buffer and self.buffer_start <= offset <= self.buffer_start + len(self.buffer):
+            self.buffer_position = offset - self.buffer_start
+            return offset
+
+        # Elsewhere, the groups decompressed in advance are lost
+        for _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.next_block = max(bisect.bisect_right(self.uncompressed_offsets, offset) - 1, 0)
+        self.next_block = min(self.next_block, len(self.compressed_offsets) - 1)
+        self.buffer_start = self.uncompressed_offsets[self.next_block]
+        self.buffer = b''
+        self.buffer_position = 0
+        self.submit_next()
+        if self.next_buffer():
+            self.buffer_position = offset - self.buffer_start
+        else:
+            self.buffer_start = offset
+        return offset
+
+    def close(self):
+        if not self.closed:
+            self.executor.shutdown(wait=False)
+            self.file.close()
+        super().close()
+
+
+###
+# Open an input file for reading, whether it is compressed or not (see compression_type)
+# Inputs:
+#   - file_path : path to the file
+#   - mode : either 'rb' (bytes) or 'r' (text, decoded the same way whether the file is compressed or not)
+# Output:
+#   - A file object
+###
+def open_input(file_path, mode='rb'):
+    compression = compression_type(file_path)
+    if compression == 'plain':
+        if mode == 'r':
+            return open(file_path, mode, encoding=text_encoding)
+        return open(file_path, mode)
+
+    if compression == 'bgzf':
+        stream = io.BufferedReader(BGZFReader(file_path), buffer_size=1 << 20)
+    # A plain gzip file can only be decompressed from its start, by a single thread
+    else:
+        stream = gzip.open(file_path, 'rb')
+    if mode == 'r':
+        return io.TextIOWrapper(stream, encoding=text_encoding)
+    return stream
@@ -28,9 +28,13 @@ wget $accession$whole_genome
 gunzip < $whole_genome > $output_genome
 rm $whole_genome
 
+# Keep only wanted records (through a selection manifest next to the genome, the genome itself is kept as it is)
+python3 ../scripts/keep_wanted_records.py $output_genome
+
+# The sample chromosome is then selected among these wanted records
 if [[ $species == hsap_sample || $species == mmus_sample ]]; then
     python3 ../scripts/sampling_chromosomes.py $output_genome
 fi
 
-# Keep only wanted records
-python3 ../scripts/keep_wanted_records.py $output_genome
+# Build the packed cache of the genome, memory-mapped by all the sampling scripts
+python3 ../scripts/cache_genome.py $output_genome
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
-"""This script will extract the pairwise overlapping nucleotides of each factors from the factor proxies
-Computational time: ranges from 30 minutes to instant.
+"""This script will extract the overlapping nucleotides of each combination of factors (e.g. CDS-RNA, CDS-RNA-tandem)
+from the factor proxies, all at once in a single pass over the ranges of each record
 """
-from Bio import SeqIO
 import sys
-import glob
 import os.path
+import numpy as np
 from joblib import Parallel, delayed
+from genome_cache import open_genome
+from range_functions import range_store, build_factor_ranges, fetch_record_ranges, merge_ranges, read_range_store, \
+    write_range_store
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -39,206 +41,111 @@ def checking_parent(file_path):
 
 
 ###
-# Extract all the path of files matching a certain pattern in a directory
+# Find all the combinations of at least 2 factors within a set of factors (as bits of an integer)
 ###
-def extract_path(files_directory, pattern):
-    return glob.glob(files_directory + pattern)
+def factor_combinations(factor_set):
+    combinations = list()
+    # Going through all the subsets of bits of the set
+    combination = factor_set
+    while combination:
+        if bin(combination).count('1') >= 2:
+            combinations.append(combination)
+        combination = (combination - 1) & factor_set
+    return combinations
 
 
 ###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
+# Find the overlapping ranges of a record between all the factors at once, sweeping once over the ends of all the
+# ranges: each factor is a bit, so that the set of factors covering each segment (in between two consecutive ends) is
+# the sum of the bits of the ranges started but not ended yet
 # Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return (records)
-
-
-###
-# Count all the factor only record length
-###
-def count_pure_record_length(record, proxies_directory):
-    record_ranges = proxies_directory + '/' + record.id
-
-    length_factor_only = 0
-    try:
-        with open(record_ranges, 'r') as all_ranges:
-            for each_range in all_ranges:
-                line_range = each_range.strip().split()
-                # Add the range length
-                length_factor_only += len(range(int(line_range[0]), int(line_range[1]) + 1))
-    # If no record for this factor, return length of 0
-    except FileNotFoundError:
-        return 0
-
-    return length_factor_only
-
-
-###
-# Extract ranges as a list of ranges
-###
-def extract_ranges(ranges_file_path):
-    ranges = list()
-    with open(ranges_file_path, 'r') as ranges_file:
-        for each_line in ranges_file:
-            ranges.append([int(each_line.strip().split('\t')[0]), int(each_line.strip().split('\t')[1])])
-    return ranges
-
-
-###
-# Find intersects between two list of ranges (a and b)
-###
-def intersects(a, b):
-    overlap_ranges = list()
-    i = j = 0
-    while i < len(a) and j < len(b):
-        a_left, a_right = a[i]
-        b_left, b_right = b[j]
-        end_pts = sorted([a_left, a_right, b_left, b_right])
-        middle = [end_pts[1], end_pts[2]]
-
-        if a_right < b_right:
-            i += 1
-        else:
-            j += 1
-
-        if a_right >= b_left and b_right >= a_left:
-            overlap_ranges.append(middle)
-
-    length_of_list = len(overlap_ranges)
-
-    # We will also merge two intervals which are next to each other
-    i = 0
-    while i < (length_of_list - 1):
-        if overlap_ranges[i][1] in (overlap_ranges[i + 1][0], overlap_ranges[i + 1][0] - 1):
-            overlap_ranges[i:i + 2] = [[overlap_ranges[i][0], overlap_ranges[i + 1][1]]]
-            length_of_list -= 1
-        else:
-            i += 1
-
-    return overlap_ranges
-
-
-###
-# Will check if we already computed this combination of factor/comparison but in a different order
-###
-def check_for_repeat(all_overlaps, factor, comparison):
-    all_names = comparison.split('-')
-    all_names.append(factor)
-    repeat = False
-
-    for each_already in all_overlaps:
-        each_already = each_already.split('-')
-
-        in_common = list(set(all_names) & set(each_already))
-
-        if len(in_common) == len(all_names):
-            repeat = True
-
-    return repeat
-
-
-def pairwise_overlap(record, factor_directory, factor, comparison_directory, comparison, overlap_directory):
-    # Catch any missing record : as we will perform this step in parallel, we want to avoid raising errors
-    if os.path.isfile(factor_directory + '/' + record.id) and os.path.isfile(comparison_directory + '/' + record.id):
-        factor_ranges = extract_ranges(factor_directory + '/' + record.id)
-        comparison_ranges = extract_ranges(comparison_directory + '/' + record.id)
-
-        # Find all overlapping ranges
-        overlap_ranges = intersects(factor_ranges, comparison_ranges)
-
-        # If we do find some overlaps -> must write them to remove them from the factor ranges files later on
-        if overlap_ranges:
-            # We will now store the overlapping ranges
-            checking_parent(overlap_directory + '/*')
-            with open(overlap_directory + '/' + record.id, 'w') as overlap_file:
-                for each_range in overlap_ranges:
-                    overlap_file.write('\t'.join([str(each) for each in each_range]) + '\n')
-
-            # We also return the factor_comparison to avoid repeats
-            return '-'.join([factor, comparison])
-
-
-def comparing_ranges(factor_to_compare, all_factors, records, species_proxies_directory):
-    # We will store all the overlap for this pairwise comparisons
-    all_overlaps = set()
-
-    for each_factor in range(len(all_factors)):
-        factor = all_factors[each_factor]
-        for each_comparison in range(len(factor_to_compare)):
-            comparison = factor_to_compare[each_comparison]
-
-            # Avoid comparing factor overlap to himself...
-            # Note the split by _ for further comparison (e.g. CDS_RNA vs CDS)
-            if factor in comparison.split('-'):
-                continue
-            # We only do the "lower diagonal" when first comparing each individual factor to each other
-            # as we don't want to do twice the same operation (e.g. CDS_RNA and RNA_CDS)
-            elif check_for_repeat(all_overlaps, factor, comparison):
-                continue
-            else:
-                factor_directory = species_proxies_directory + '/' + factor
-                comparison_directory = species_proxies_directory + '/' + comparison
-                overlap_directory = species_proxies_directory + '/' + '-'.join([factor, comparison])
-
-                # Find the sum of all nucleotide which are either factor or comparison factor
-                pure_factor_length = sum([count_pure_record_length(records[each_record], factor_directory)
-                                          for each_record in range(len(records))])
-                pure_comparison_length = sum([count_pure_record_length(records[each_record], comparison_directory)
-                                              for each_record in range(len(records))])
-
-                # Make sure neither are empty
-                if pure_factor_length and pure_comparison_length:
-                    overlaps = Parallel(n_jobs=n_threads)(delayed(pairwise_overlap)
-                                                      (records[each_record], factor_directory, factor,
-                                                       comparison_directory, comparison, overlap_directory)
-                                                      for each_record in range(len(records)))
-                    # If there did was an overlap in any of the records, keep it to avoid repeats
-                    if any(overlaps):
-                        all_overlaps.add([each for each in overlaps if each][0])
-
-    return list(all_overlaps)
-
-
-###
-# Remove the overlapping ranges of factors
+#   - factor_record_ranges : list of the ranges of the record for each factor (see fetch_record_ranges), or None if the
+#       factor was not computed on this record
+# Output:
+#   - A dictionary with, for each combination of at least 2 factors (as the sum of their bits) found in this record, the
+#       ranges of the nucleotides within all these factors (whatever the other factors they are also in)
+###
+def record_overlaps(factor_record_ranges):
+    all_positions = list()
+    all_changes = list()
+    for each_factor, record_ranges in enumerate(factor_record_ranges):
+        if record_ranges is not None and len(record_ranges):
+            # A factor covers each nucleotide only once
+            record_ranges = merge_ranges(record_ranges)
+            factor_bit = np.int64(1) << each_factor
+            # The factor starts at the start of each range, and stops after its end
+            all_positions.extend([record_ranges[:, 0], record_ranges[:, 1] + 1])
+            all_changes.extend([np.full(len(record_ranges), factor_bit), np.full(len(record_ranges), -factor_bit)])
+
+    # At least 2 factors are needed to overlap
+    if len(all_positions) < 4:
+        return dict()
+
+    positions = np.concatenate(all_positions)
+    changes = np.concatenate(all_changes)
+    order = np.argsort(positions, kind='stable')
+    positions = positions[order]
+
+    # All the changes at the same position are summed, giving the factors of the segment starting there
+    segment_starts = np.concatenate(([0], np.flatnonzero(np.diff(positions)) + 1))
+    segment_factors = np.cumsum(np.add.reduceat(changes[order], segment_starts))[:-1]
+    segments = np.column_stack((positions[segment_starts[:-1]], positions[segment_starts[1:]] - 1))
+
+    # Each segment is within all the combinations of its factors
+    overlaps = dict()
+    combinations = set()
+    for factor_set in np.unique(segment_factors).tolist():
+        combinations.update(factor_combinations(factor_set))
+    for combination in combinations:
+        # The segments next to each other are joined (e.g. CDS-RNA then CDS-RNA-tandem are all within CDS-RNA)
+        overlaps[combination] = merge_ranges(segments[(segment_factors & combination) == combination])
+    return overlaps
+
+
+###
+# Extract the overlapping ranges of all the combinations of factors
 # Inputs:
-#   - genomes_directory : directory of the genomes of species
-#   - main_proxies_directory : main directory of the proxies obtained through the factor_proxies script
+#   - all_factor_ranges : dictionary of the FactorRanges of each factor (see read_range_store), to which the
+#       overlapping ranges are added (named after their factors, e.g. CDS-RNA-tandem)
 #   - all_factors : list of all wanted factors
-#   - species : name of the wanted species
-###
-def extract_overlap(species_proxies_directory, all_factors, records):
-    # This vector will help us track when we still have to make pairwise comparison of overlapping ranges
-    to_compare = len(all_factors)
-
-    # The first pairwise comparison we will make is all_factor VS all_factor anyway
-    factor_to_compare = all_factors
-    while to_compare >= 2:
-        factor_to_compare = comparing_ranges(factor_to_compare, all_factors, records, species_proxies_directory)
-
-        # If we have at least 2 set of overlapping factor, there is a chance nucleotide might be overlapping
-        # in all of these different factors (e.g. if CDS_RNA and CDS_tandem, we might have CDS_RNA_tandem overlaps)
-        to_compare = len(factor_to_compare)
+#   - records : index of the genome records (see open_genome)
+# Output:
+#   - The list of the combinations of factors which were found
+###
+def extract_overlap(all_factor_ranges, all_factors, records):
+    overlaps = Parallel(n_jobs=n_threads)(delayed(record_overlaps)
+                                          ([fetch_record_ranges(all_factor_ranges[factor], record.id)
+                                            for factor in all_factors])
+                                          for record in records)
+
+    # Each combination only keeps the records with overlaps
+    all_combinations = sorted(set([combination for record_overlap in overlaps for combination in record_overlap]))
+    all_overlaps = list()
+    for combination in all_combinations:
+        overlap = '-'.join([all_factors[each_factor] for each_factor in range(len(all_factors))
+                            if combination >> each_factor & 1])
+        all_factor_ranges[overlap] = build_factor_ranges([(records[each_record].id, overlaps[each_record][combination])
+                                                          for each_record in range(len(records))
+                                                          if combination in overlaps[each_record]])
+        all_overlaps.append(overlap)
+
+    return all_overlaps
 
 
 # Fetch this species records for the lengths
-records = fetch_fasta(species_genome)
+records = open_genome(species_genome).records
+
+# All the ranges of this species are read from its range store
+all_factor_ranges = read_range_store(range_store(species))
 
-# Directory which lead to the different species proxies
-species_proxies_directory = '/'.join(["../files/factor_proxies", species])
+# Find all the different factors ready (the overlaps and uncategorized ranges of a previous analysis are left out)
+all_factors = sorted([each for each in all_factor_ranges if '-' not in each and each != 'uncategorized'])
 
-# Find all the different factors ready
-all_factors = [os.path.basename(each) for each in extract_path(species_proxies_directory + '/', '*')]
+all_overlaps = extract_overlap(all_factor_ranges, all_factors, records)
 
-extract_overlap(species_proxies_directory, all_factors, records)
+# The overlapping ranges are stored as new factors (e.g. CDS-RNA), replacing the ones of a previous analysis
+write_range_store(range_store(species), {overlap: all_factor_ranges[overlap] for overlap in all_overlaps},
+                  [each for each in all_factor_ranges if '-' in each and each not in all_overlaps])
 
 # Follow the progression of the analysis
 checking_parent(follow_up)
@@ -2,13 +2,12 @@
 
 """This script will extract the uncategorized nucleotides
 """
-from Bio import SeqIO
 import sys
-import glob
 import os.path
 from joblib import Parallel, delayed
-import itertools
-
+from genome_cache import open_genome
+from range_functions import range_store, build_factor_ranges, fetch_all_record_ranges, merge_ranges, list_factors, \
+    read_range_store, write_range_store
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -39,104 +38,55 @@ def checking_parent(file_path):
         pass
 
 
-###
-# Extract all the path of files matching a certain pattern in a directory
-###
-def extract_path(files_directory, pattern):
-    return glob.glob(files_directory + pattern)
-
-
-###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
-# Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return (records)
-
-
-###
-# Extract ranges as a list of ranges
-###
-def extract_ranges(ranges_file_path):
-    ranges = list()
-    with open(ranges_file_path, 'r') as ranges_file:
-        for each_line in ranges_file:
-            ranges.append([int(each_line.strip().split('\t')[0]), int(each_line.strip().split('\t')[1])])
-    return ranges
-
-
 ###
 # Using all the precomputed ranges of factors, will find the pieces in between
+# Inputs:
+#   - record : CacheEntry of the record (see open_genome)
+#   - all_record_ranges : numpy matrix of the ranges of the record, of all the factors
+# Output:
+#   - The list of uncategorized ranges of the record
 ###
-def extract_uncategorized(record, all_files, species_proxies_directory):
-    # This list will contain all the record ranges
-    record_ranges = list()
-
-    record_files = [each_file for each_file in all_files if os.path.basename(each_file) == record.id]
-    for each_file in record_files:
-        factor_ranges = extract_ranges(each_file)
-        record_ranges.extend(factor_ranges)
-    record_ranges.sort()
-
-    # Merge two intervals which are next to each other
-    length_of_list = len(record_ranges)
-
-    i = 0
-    while i < (length_of_list - 1):
-        if record_ranges[i][1] in (record_ranges[i + 1][0], record_ranges[i + 1][0] - 1):
-            record_ranges[i:i + 2] = [[record_ranges[i][0], record_ranges[i + 1][1]]]
-            length_of_list -= 1
-        else:
-            i += 1
+def extract_uncategorized(record, all_record_ranges):
+    # All the record ranges, merging the ones which are next to each other
+    record_ranges = merge_ranges(all_record_ranges).tolist()
+
+    # A record without any factor is uncategorized as a whole
+    if not record_ranges:
+        return [[0, record.length - 1]]
 
     very_first_range = record_ranges[0]
 
-    # We will remove each time the first range to compare to the next, until we only have one range left
-    uncategorized = list()
-    while len(record_ranges) > 1:
-        first_range = record_ranges.pop(0)
-        uncategorized.append([first_range[1] + 1, record_ranges[0][0] - 1])
+    # The uncategorized ranges are in between each range and the next one
+    uncategorized = [[first_range[1] + 1, next_range[0] - 1]
+                     for first_range, next_range in zip(record_ranges[:-1], record_ranges[1:])]
 
     # if the first start is not the start of the record, must add one first range
     if very_first_range[0] != 0:
         uncategorized.insert(0, [0, very_first_range[0] - 1])
 
     # On the other end, if the last range is not until the end, we need to add this last range
-    if record_ranges[0][1] != len(record):
-        uncategorized.append([record_ranges[0][1] + 1, len(record) - 1])
-
-    # If we find some ranges -> can write them
-    if uncategorized:
-        uncategorized_directory = '/'.join([species_proxies_directory, 'uncategorized', record.id])
-        checking_parent(uncategorized_directory)
+    if record_ranges[-1][1] != record.length - 1:
+        uncategorized.append([record_ranges[-1][1] + 1, record.length - 1])
 
-        # We will now store the clean ranges
-        with open(uncategorized_directory, 'w') as outfile:
-            for each_range in uncategorized:
-                outfile.write('\t'.join([str(each) for each in each_range]) + '\n')
+    return uncategorized
 
 
 # Fetch this species records for the lengths
-records = fetch_fasta(species_genome)
+records = open_genome(species_genome).records
 
-# Directory which lead to the different species proxies
-species_proxies_directory = '/'.join(["../files/factor_proxies", species])
+# All the ranges of this species are read from its range store, except the uncategorized ones of an earlier run (which
+# would already cover every gap)
+all_factor_ranges = read_range_store(range_store(species), [each for each in list_factors(range_store(species))
+                                                            if each != 'uncategorized'])
 
-# Find all the different factors ready
-all_factors = [each for each in extract_path(species_proxies_directory + '/', '*')]
-all_files = list(itertools.chain(*[extract_path(each + '/', '*') for each in all_factors]))
+uncategorized = Parallel(n_jobs=n_threads)(delayed(extract_uncategorized)
+                                           (record, fetch_all_record_ranges(all_factor_ranges, record.id))
+                                           for record in records)
 
-Parallel(n_jobs=n_threads)(delayed(extract_uncategorized)
-                           (records[each_record], all_files, species_proxies_directory)
-                           for each_record in range(len(records)))
+# If we find some ranges -> can store them
+write_range_store(range_store(species), {'uncategorized': build_factor_ranges(
+    [(records[each_record].id, uncategorized[each_record]) for each_record in range(len(records))
+     if uncategorized[each_record]])})
 
 # Follow the progression of the analysis
 checking_parent(follow_up)
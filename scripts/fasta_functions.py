@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions shared by the analysis scripts to read fasta files (e.g. the genomes),
+without ever loading a whole genome as Python objects
+"""
+import sys
+import os
+import collections
+import numpy
+from compressed_files import open_input
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# A fasta record, as light as possible:
+#   - id : first word of the header (as Bio.SeqIO)
+#   - description : whole header
+#   - length : number of nucleotides
+#   - seq : the sequence, as bytes (or numpy array of ASCII codes), or None if only the metadata were read
+FastaRecord = collections.namedtuple('FastaRecord', ['id', 'description', 'length', 'seq'])
+
+# Size of the blocks read at once from the fasta file
+block_size = 1 << 24
+
+# Characters which are part of the fasta layout, not of the sequence
+layout_characters = b' \t\r\n'
+
+
+###
+# Find the path of the selection manifest of a fasta file: the ids of the only records to use, one per line
+# (see write_selection), so that unwanted records are skipped without ever rewriting the fasta file
+###
+def selection_file(fasta_file):
+    return fasta_file + '.records'
+
+
+###
+# Fetch the ids of the selected records of a fasta file
+# Output:
+#   - A set of ids, or None if there is no selection manifest (= all the records are used)
+###
+def fetch_selection(fasta_file):
+    try:
+        with open(selection_file(fasta_file), 'r') as selection:
+            return set(each_line.strip() for each_line in selection if each_line.strip())
+    except FileNotFoundError:
+        return None
+
+
+###
+# Write the selection manifest of a fasta file
+# Inputs:
+#   - fasta_file : path to the fasta file
+#   - ids : ids of the records to use, in the wanted order
+###
+def write_selection(fasta_file, ids):
+    # Written aside then renamed, as other processes may read the selection at the same time
+    temporary_file = selection_file(fasta_file) + '.' + str(os.getpid())
+    with open(temporary_file, 'w') as selection:
+        for each_id in ids:
+            selection.write(each_id + '\n')
+    os.replace(temporary_file, selection_file(fasta_file))
+
+
+###
+# Extract the id of a record out of its header (first word, as Bio.SeqIO)
+###
+def header_id(header):
+    description = header.decode('latin-1').strip()
+    return description.split(None, 1)[0] if description else ''
+
+
+###
+# Build a FastaRecord out of a header and the pieces of sequence read
+###
+def build_record(header, pieces, length, with_sequence, as_array):
+    description = header.decode('latin-1').strip()
+    record_id = header_id(header)
+    if not with_sequence:
+        return FastaRecord(record_id, description, length, None)
+
+    sequence = b''.join(pieces)
+    if as_array:
+        sequence = numpy.frombuffer(sequence, dtype=numpy.uint8)
+    return FastaRecord(record_id, description, len(sequence), sequence)
+
+
+###
+# Read a fasta file one record at a time, without ever keeping more than one record in memory
+# The file is read by big blocks, the layout characters (line breaks) being removed on a whole block at once
+# Inputs:
+#   - fasta_file : path to the fasta file (plain, gzip or BGZF, see open_input)
+#   - with_sequence : whether or not (by default = True) the sequences should be kept
+#       Note: if not, only the ids and lengths are found, and no sequence is ever built
+#   - as_array : whether or not (by default = False) the sequences should be numpy arrays (uint8) of ASCII codes
+#       instead of bytes (both can directly be given to the CGR functions)
+#   - all_records : whether or not (by default = False) the records left out by the selection manifest of the file
+#       (see fetch_selection) should be read too
+# Output:
+#   - Yield a FastaRecord per (selected) record of the file, in the order of the file
+###
+def read_fasta(fasta_file, with_sequence=True, as_array=False, all_records=False):
+    selection = None if all_records else fetch_selection(fasta_file)
+    header = None
+    wanted = True
+    pieces = list()
+    length = 0
+    in_header = False
+    buffer = b''
+
+    with open_input(fasta_file) as fasta:
+        while True:
+            block = fasta.read(block_size)
+            buffer += block
+            position = 0
+            while position < len(buffer):
+                if in_header:
+                    end_header = buffer.find(b'\n', position)
+                    # The header is cut by the end of the block: wait for the next block
+                    if end_header < 0:
+                        if block:
+                            break
+                        end_header = len(buffer)
+                    header = buffer[position:end_header]
+                    # The sequence of an unwanted record is only skipped
+                    wanted = selection is None or header_id(header) in selection
+                    in_header = False
+                    position = end_header + 1
+                else:
+                    # As long as there is no new header, everything is sequence
+                    next_header = buffer.find(b'>', position)
+                    sequence_end = len(buffer) if next_header < 0 else next_header
+                    # Anything before the first header is not part of any record (as Bio.SeqIO)
+                    if header is not None:
+                        piece = buffer[position:sequence_end].translate(None, layout_characters)
+                        length += len(piece)
+                        if with_sequence and wanted:
+                            pieces.append(piece)
+                    if next_header < 0:
+                        position = len(buffer)
+                    else:
+                        if header is not None and wanted:
+                            yield build_record(header, pieces, length, with_sequence, as_array)
+                        header = None
+                        pieces = list()
+                        length = 0
+                        in_header = True
+                        position = next_header + 1
+            buffer = buffer[position:]
+
+            if not block:
+                break
+
+    if header is not None and wanted:
+        yield build_record(header, pieces, length, with_sequence, as_array)
+
+
+###
+# Fetch the ids and lengths of all the records of a fasta file, without reading any sequence into memory
+# Input:
+#   - fasta_file : path to the fasta file
+# Output:
+#   - A list of FastaRecord (without sequence), in the order of the file
+###
+def fetch_fasta_metadata(fasta_file):
+    try:
+        return list(read_fasta(fasta_file, with_sequence=False))
+    except OSError:
+        print("Cannot open %s, check path!" % fasta_file)
+        sys.exit()
+
+
+###
+# Check if a sequence (bytes) only contain standard nucleotides (no unknown nucleotides for example)
+###
+def only_nucleotides(sequence):
+    return not bytes(sequence).translate(None, b'ATCGatcg')
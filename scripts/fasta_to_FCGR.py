@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""This script compute k-mer frequencies of all windows of a sample fasta file, without going through CGR files
+"""
+import sys
+import os
+from CGR_functions import nucleotide_codes, CGR_coordinates, FCGR_from_codes
+from window_manifest import read_samples
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Species sample windows path (either *_sample.windows, *_pure.windows or *_masked.windows, or a fasta file):
+species_sample = str(sys.argv[1])
+# Species abbreviation:
+species = str(sys.argv[2])
+# Wanted window size:
+window_size = int(sys.argv[3])
+# Wanted k-mer size:
+k_size = int(sys.argv[4])
+# Sample size:
+sample_size = int(sys.argv[5])
+# Output file:
+output = str(sys.argv[6])
+# Optional tracking file of the CGRs: if given, the CGR files are also written (as windowed_CGR.py would)
+if len(sys.argv) > 7:
+    follow_up = str(sys.argv[7])
+else:
+    follow_up = ''
+
+
+###
+# Check if parent directory is present, if not create it
+###
+def checking_parent(file_path):
+    # We don't need the file name, so will take everything but the last part
+    parent_directories = '/'.join(file_path.split('/')[0:(len(file_path.split('/')) - 1)])
+    # As we uses parallel, we ended up we one thread doesn't seeing the directory, attempting
+    # creating it, while another just did the same -> error "The file already exist", and stopped everything...
+    try:
+        if not os.path.exists(parent_directories):
+            os.makedirs(parent_directories)
+    except:
+        pass
+
+
+# The follow_up file enable us to know if we are working on "scaling" or "masking/purifying",
+# and will change where we store the CGRs:
+def which_directory(follow_up, window_size, species):
+    if follow_up.split('/')[0] == '..':
+        # We are in the scaling case, where we use the genome "as it is"
+        # We store CGRs in source directory:
+        seq_directory = '/'.join(['../files/CGRs', '_'.join([str(window_size), str(sample_size)]), species])
+    else:
+        # We are in the masking/purifying case, where we used sequence of the factor only
+        # We store CGRs directly in the purifying directory
+        factor = follow_up.split('/')[-1].split('_')[0]
+        seq_directory = '/'.join(['files/CGRs', '_'.join([str(window_size), str(sample_size)]), species, factor])
+    return seq_directory
+
+
+###
+# Compute the FCGR of a window, straight from its sequence
+# Inputs:
+#   - window : sequence of the sample window
+#   - k_size : k-mer size
+#   - CGR_file : path to the CGR file of this window
+#           Note: if empty, the CGR is not computed at all
+# Output:
+#   - The FCGR (reverse complementary k-mer summed) as a numpy array,
+#       or None if the window contain any non standard nucleotides (including unknown nucleotides)
+###
+def N_sensitive_FCGR(window, k_size, CGR_file):
+    try:
+        codes = nucleotide_codes(window)
+    except ValueError:
+        return None
+
+    if CGR_file:
+        CGR_coordinates(window, CGR_file)
+
+    return FCGR_from_codes(k_size, codes, halving=True)
+
+
+# The sample windows are read one at a time, their sequences being fetched from the genome cache
+records = read_samples(species_sample)
+
+if follow_up:
+    CGR_directory = which_directory(follow_up, window_size, species)
+
+checking_parent(output)
+# Opening concatenated file on top level, to avoid rewriting at each record
+with open(output, 'w') as outfile:
+    # Counting is cheap enough to be done in this process: no need to hand each window to another process
+    for each_record, record in enumerate(records):
+        if follow_up:
+            CGR_file = CGR_directory + '/' + record.id + '_' + str(each_record)
+        else:
+            CGR_file = ''
+        FCGR = N_sensitive_FCGR(record.seq, k_size, CGR_file)
+
+        # Write each region's genomic signature in a single file, in the initial order of sampling:
+        if FCGR is not None:
+            outfile.write(record.id + '\t' + '\t'.join(map(str, FCGR.tolist())) + '\t\n')
+
+# Follow the progression of the analysis
+if follow_up:
+    checking_parent(follow_up)
+    with open(follow_up, 'w') as file:
+        file.write('')
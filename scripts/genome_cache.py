@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions to convert a genome into a 2-bit packed binary cache, which is then memory-mapped
+(read-only) by all the analysis scripts: all the processes share the same copy of the genome in memory
+"""
+import os
+import fcntl
+import shutil
+import threading
+import collections
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import numpy
+from CGR_functions import nucleotide_table
+from fasta_functions import read_fasta, fetch_selection
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# A record of the cache:
+#   - id : first word of the header
+#   - length : number of nucleotides
+#   - sequence_offset : position (in bytes) of the record in the packed sequence
+#   - unknown_offset/unknown_count : first line and number of lines of the record in the unknown runs
+#   - mask_offset/mask_count : first line and number of lines of the record in the soft-masked runs
+CacheEntry = collections.namedtuple('CacheEntry', ['id', 'length', 'sequence_offset', 'unknown_offset',
+                                                   'unknown_count', 'mask_offset', 'mask_count'])
+
+# The cache of a genome:
+#   - records : list of CacheEntry of the selected records, in the order of the fasta file
+#   - sequence : packed corner codes (see nucleotide_table), 4 nucleotides per byte, the first in the highest bits
+#   - unknown_runs : matrix of (start, end, character) of each run of non standard nucleotides (e.g. N)
+#   - mask_runs : matrix of (start, end) of each run of soft-masked (lower case) characters
+GenomeCache = collections.namedtuple('GenomeCache', ['records', 'sequence', 'unknown_runs', 'mask_runs'])
+
+# A genome served by a genome server (see genome_server.py), used exactly as a GenomeCache:
+#   - records : list of CacheEntry, in the order of the fasta file
+#   - server_address : path of the socket of the server
+#   - genome_file : absolute path to the fasta file of the genome, as known by the server
+RemoteGenome = collections.namedtuple('RemoteGenome', ['records', 'server_address', 'genome_file'])
+
+# Environment variable giving the path of the socket of the genome server (if any)
+server_variable = 'GENOME_SERVER'
+# Environment variable giving the key (in hexadecimal) authenticating the scripts to the genome server
+key_variable = 'GENOME_SERVER_KEY'
+
+# The connections of this process to the genome server, one per thread (a connection can not be shared)
+server_connections = threading.local()
+
+# Nucleotides of each corner code
+corner_nucleotides = numpy.frombuffer(b'ACTG', dtype=numpy.uint8)
+
+
+###
+# Find the path of the cache directory of a genome
+###
+def cache_directory(genome_file):
+    return genome_file + '.packed'
+
+
+###
+# Find the (start, end) of each run of True of a boolean numpy array
+###
+def find_runs(is_in_run):
+    edges = numpy.diff(numpy.concatenate(([0], is_in_run.view(numpy.int8), [0])))
+    return numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)
+
+
+###
+# Convert a genome into its 2-bit packed cache
+# The fasta file is read one record at a time, each record being appended to the cache files
+# Inputs:
+#   - genome_file : path to the fasta file of the genome
+#   - directory : path of the cache directory
+###
+def build_genome_cache(genome_file, directory):
+    with open(os.path.join(directory, 'sequence.bin'), 'wb') as sequence_file, \
+            open(os.path.join(directory, 'unknown_runs.bin'), 'wb') as unknown_file, \
+            open(os.path.join(directory, 'mask_runs.bin'), 'wb') as mask_file, \
+            open(os.path.join(directory, 'index.tsv'), 'w') as index_file:
+        sequence_offset = 0
+        unknown_offset = 0
+        mask_offset = 0
+        # The cache holds all the records: the selection manifest is only applied when opening it
+        for record in read_fasta(genome_file, as_array=True, all_records=True):
+            characters = record.seq
+            lower_case = (characters >= ord('a')) & (characters <= ord('z'))
+            upper_characters = numpy.where(lower_case, characters - 32, characters).astype(numpy.uint8)
+            codes = nucleotide_table[characters]
+
+            # Runs of the same non standard nucleotide (stored in upper case, the case is in the soft-mask runs)
+            unknown = codes == 255
+            same_as_next = numpy.zeros(len(characters), dtype=bool)
+            same_as_next[:-1] = unknown[1:] & (upper_characters[1:] == upper_characters[:-1])
+            same_as_previous = numpy.zeros(len(characters), dtype=bool)
+            same_as_previous[1:] = same_as_next[:-1]
+            unknown_starts = numpy.flatnonzero(unknown & ~same_as_previous)
+            unknown_ends = numpy.flatnonzero(unknown & ~same_as_next) + 1
+            unknown_runs = numpy.column_stack((unknown_starts, unknown_ends, upper_characters[unknown_starts]))
+            mask_runs = numpy.column_stack(find_runs(lower_case))
+
+            # 4 corner codes per byte, the unknown nucleotides being packed as A (0)
+            codes = numpy.where(unknown, 0, codes)
+            codes = numpy.concatenate((codes, numpy.zeros(-len(codes) % 4, dtype=numpy.uint8))).reshape(-1, 4)
+            packed = (codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]
+
+            sequence_file.write(packed.astype(numpy.uint8).tobytes())
+            unknown_file.write(unknown_runs.astype(numpy.int64).tobytes())
+            mask_file.write(mask_runs.astype(numpy.int64).tobytes())
+            index_file.write('\t'.join([str(each) for each in [record.id, record.length, sequence_offset,
+                                                               unknown_offset, len(unknown_runs),
+                                                               mask_offset, len(mask_runs)]]) + '\n')
+            sequence_offset += len(packed)
+            unknown_offset += len(unknown_runs)
+            mask_offset += len(mask_runs)
+
+
+###
+# Map a binary file of the cache in memory (read-only), as a numpy array
+###
+def map_array(file_path, dtype, columns=None):
+    if os.path.getsize(file_path) == 0:
+        array = numpy.zeros(0, dtype=dtype)
+    else:
+        array = numpy.memmap(file_path, dtype=dtype, mode='r')
+    if columns:
+        array = array.reshape(-1, columns)
+    return array
+
+
+###
+# Check if the cache of a genome is missing, or older than the genome file
+###
+def outdated_cache(genome_file):
+    index_path = os.path.join(cache_directory(genome_file), 'index.tsv')
+    return not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(genome_file)
+
+
+###
+# Fetch the cache of a genome, memory-mapped read-only
+# The cache is only built (next to the genome file) if it does not exist yet, or if the genome file changed since
+# As other processes may read or build the same cache at the same time, the cache is only read under a shared lock,
+# and only replaced under an exclusive one (the files already mapped by other processes stay valid)
+# Input:
+#   - genome_file : path to the fasta file of the genome
+# Output:
+#   - A GenomeCache, whose records follow the selection manifest of the genome (see fetch_selection)
+###
+def fetch_genome_cache(genome_file):
+    directory = cache_directory(genome_file)
+    index_path = os.path.join(directory, 'index.tsv')
+
+    with open(directory + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        if outdated_cache(genome_file):
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have built it while waiting for the lock
+            if outdated_cache(genome_file):
+                # Built aside, then the old cache (if any) is moved aside before renaming the new one
+                temporary_directory = directory + '.' + str(os.getpid())
+                old_directory = temporary_directory + '.old'
+                shutil.rmtree(temporary_directory, ignore_errors=True)
+                os.makedirs(temporary_directory)
+                build_genome_cache(genome_file, temporary_directory)
+                if os.path.exists(directory):
+                    os.rename(directory, old_directory)
+                os.rename(temporary_directory, directory)
+                shutil.rmtree(old_directory, ignore_errors=True)
+            fcntl.flock(lock, fcntl.LOCK_SH)
+
+        selection = fetch_selection(genome_file)
+        with open(index_path, 'r') as index_file:
+            records = [CacheEntry(line[0], *[int(each) for each in line[1:7]])
+                       for line in (each_line.rstrip('\n').split('\t') for each_line in index_file)]
+        records = [entry for entry in records if selection is None or entry.id in selection]
+
+        return GenomeCache(records,
+                           map_array(os.path.join(directory, 'sequence.bin'), numpy.uint8),
+                           map_array(os.path.join(directory, 'unknown_runs.bin'), numpy.int64, 3),
+                           map_array(os.path.join(directory, 'mask_runs.bin'), numpy.int64, 2))
+
+
+###
+# Find the key authenticating the scripts to the genome server (None if not given)
+###
+def server_key():
+    key = os.environ.get(key_variable)
+    if not key:
+        return None
+    return bytes.fromhex(key)
+
+
+###
+# Fetch the connection of this thread to the genome server, opened at its first use
+# Note: the connections of a forked process are never the ones of its parent
+###
+def server_connection(server_address):
+    if getattr(server_connections, 'pid', None) != os.getpid():
+        server_connections.pid = os.getpid()
+        server_connections.connections = dict()
+    if server_address not in server_connections.connections:
+        server_connections.connections[server_address] = Client(server_address, family='AF_UNIX',
+                                                                authkey=server_key())
+    return server_connections.connections[server_address]
+
+
+###
+# Ask something about a genome to the genome server
+# Inputs:
+#   - server_address : path of the socket of the server
+#   - genome_file : absolute path to the fasta file of the genome
+#   - command : either 'records' or the name of one of the fetching functions of this script
+#   - arguments : arguments of the function, after the genome
+# Output:
+#   - The answer of the server (an error raised on the server side is raised again here)
+###
+def ask_server(server_address, genome_file, command, *arguments):
+    connection = server_connection(server_address)
+    connection.send((command, genome_file, arguments))
+    answer = connection.recv()
+    if isinstance(answer, Exception):
+        raise answer
+    return answer
+
+
+###
+# Open a genome: from the genome server if one is running (see genome_server.py), which keeps every genome loaded
+# for all the jobs of the pipeline, and otherwise straight from its cache (see fetch_genome_cache)
+# Input:
+#   - genome_file : path to the fasta file of the genome
+# Output:
+#   - Either a RemoteGenome or a GenomeCache, which can both be given to all the fetching functions of this script
+###
+def open_genome(genome_file):
+    server_address = os.environ.get(server_variable)
+    # Without its key, the server can not be asked
+    if server_address and server_key() is not None:
+        try:
+            server_connection(server_address)
+        except (OSError, AuthenticationError):
+            # No server running (anymore), or not the right key: fall back to the cache
+            server_address = None
+        if server_address:
+            genome_file = os.path.abspath(genome_file)
+            return RemoteGenome(ask_server(server_address, genome_file, 'records'), server_address, genome_file)
+    return fetch_genome_cache(genome_file)
+
+
+###
+# Find the runs of a record which overlap [start, end) (runs are sorted and do not overlap)
+###
+def overlapping_runs(runs, start, end):
+    first = numpy.searchsorted(runs[:, 1], start, side='right')
+    last = numpy.searchsorted(runs[:, 0], end, side='left')
+    return runs[first:last]
+
+
+###
+# Check if a part of a record contains any non standard nucleotide (e.g. N), straight from the unknown runs
+# (binary search), without fetching the sequence
+# Inputs:
+#   - cache : GenomeCache (or RemoteGenome) of the genome (see open_genome)
+#   - entry : CacheEntry of the record
+#   - start : first position (0-based) of the wanted sequence
+#   - end : position after the last one of the wanted sequence
+#       Note: both behave exactly as in a Python slice of the sequence (e.g. negative positions)
+# Output:
+#   - True if at least one nucleotide of [start, end) is not A, C, T or G (in upper or lower case)
+###
+def contains_unknown(cache, entry, start, end):
+    if isinstance(cache, RemoteGenome):
+        return ask_server(cache.server_address, cache.genome_file, 'contains_unknown', entry, start, end)
+    start, end, _ = slice(start, end).indices(entry.length)
+    if start >= end:
+        return False
+    unknown_runs = cache.unknown_runs[entry.unknown_offset:entry.unknown_offset + entry.unknown_count]
+    return len(overlapping_runs(unknown_runs, start, end)) > 0
+
+
+###
+# Find all the windows of a record which only contain standard nucleotides, straight from the unknown runs
+# Inputs:
+#   - cache : GenomeCache (or RemoteGenome) of the genome (see open_genome)
+#   - entry : CacheEntry of the record
+#   - window_size : size of the windows
+#   - step : distance between the starts of two consecutive windows (by default = window_size, non overlapping)
+# Output:
+#   - A numpy array of the starts of the clean windows, in increasing order
+###
+def clean_windows(cache, entry, window_size, step=None):
+    if isinstance(cache, RemoteGenome):
+        return ask_server(cache.server_address, cache.genome_file, 'clean_windows', entry, window_size, step)
+    starts = numpy.arange(0, entry.length - window_size + 1, step or window_size)
+    unknown_runs = cache.unknown_runs[entry.unknown_offset:entry.unknown_offset + entry.unknown_count]
+
+    # The first unknown run ending after the start of a window must start after its end
+    following = numpy.searchsorted(unknown_runs[:, 1], starts, side='right')
+    clean = following == len(unknown_runs)
+    clean[~clean] = unknown_runs[following[~clean], 0] >= starts[~clean] + window_size
+    return starts[clean]
+
+
+###
+# Find the (non overlapping) windows of a record which contain any non standard nucleotide, straight from the unknown
+# runs, without fetching the sequence
+# Inputs:
+#   - cache : GenomeCache (or RemoteGenome) of the genome (see open_genome)
+#   - entry : CacheEntry of the record
+#   - window_size : size of the windows (window i being [i * window_size, (i + 1) * window_size))
+# Output:
+#   - A sorted numpy array of the numbers of these windows (only the complete windows of the record)
+###
+def unknown_windows(cache, entry, window_size):
+    if isinstance(cache, RemoteGenome):
+        return ask_server(cache.server_address, cache.genome_file, 'unknown_windows', entry, window_size)
+    n_windows = entry.length // window_size
+    unknown_runs = cache.unknown_runs[entry.unknown_offset:entry.unknown_offset + entry.unknown_count]
+
+    first_windows = unknown_runs[:, 0] // window_size
+    last_windows = numpy.minimum((unknown_runs[:, 1] - 1) // window_size, n_windows - 1)
+    in_windows = first_windows <= last_windows
+    first_windows = first_windows[in_windows]
+    n_run_windows = last_windows[in_windows] - first_windows + 1
+
+    # All the windows from the first to the last one of each run
+    run_starts = numpy.repeat(first_windows - numpy.cumsum(n_run_windows) + n_run_windows, n_run_windows)
+    return numpy.unique(run_starts + numpy.arange(n_run_windows.sum(), dtype=numpy.int64))
+
+
+###
+# Fetch the corner codes of a part of a record, straight from the packed cache
+# Inputs:
+#   - cache : GenomeCache (or RemoteGenome) of the genome (see open_genome)
+#   - entry : CacheEntry of the record
+#   - start : first position (0-based) of the wanted sequence
+#   - end : position after the last one of the wanted sequence
+#       Note: both behave exactly as in a Python slice of the sequence (e.g. negative positions)
+# Output:
+#   - A numpy array (uint8) of corner codes, the non standard nucleotides being 255 (as nucleotide_codes)
+###
+def fetch_cached_codes(cache, entry, start, end):
+    if isinstance(cache, RemoteGenome):
+        return ask_server(cache.server_address, cache.genome_file, 'fetch_cached_codes', entry, start, end)
+    start, end, _ = slice(start, end).indices(entry.length)
+    if start >= end:
+        return numpy.zeros(0, dtype=numpy.uint8)
+
+    # Unpacking the 4 corner codes of each byte
+    packed = cache.sequence[entry.sequence_offset + start // 4:entry.sequence_offset + (end + 3) // 4]
+    codes = numpy.empty((len(packed), 4), dtype=numpy.uint8)
+    for each_shift in range(4):
+        codes[:, each_shift] = (packed >> (6 - 2 * each_shift)) & 3
+    codes = codes.ravel()[start % 4:start % 4 + end - start]
+
+    unknown_runs = cache.unknown_runs[entry.unknown_offset:entry.unknown_offset + entry.unknown_count]
+    for run_start, run_end, _ in overlapping_runs(unknown_runs, start, end):
+        codes[max(run_start, start) - start:min(run_end, end) - start] = 255
+    return codes
+
+
+###
+# Fetch a part of a record straight from the packed cache, exactly as it is in the fasta file
+# Inputs:
+#   - cache : GenomeCache (or RemoteGenome) of the genome (see open_genome)
+#   - entry : CacheEntry of the record
+#   - start : first position (0-based) of the wanted sequence
+#   - end : position after the last one of the wanted sequence
+#       Note: both behave exactly as in a Python slice of the sequence (e.g. negative positions)
+# Output:
+#   - The sequence as bytes
+###
+def fetch_cached_sequence(cache, entry, start, end):
+    if isinstance(cache, RemoteGenome):
+        return ask_server(cache.server_address, cache.genome_file, 'fetch_cached_sequence', entry, start, end)
+    start, end, _ = slice(start, end).indices(entry.length)
+    if start >= end:
+        return b''
+
+    codes = fetch_cached_codes(cache, entry, start, end)
+    characters = corner_nucleotides[numpy.where(codes == 255, 0, codes)]
+
+    unknown_runs = cache.unknown_runs[entry.unknown_offset:entry.unknown_offset + entry.unknown_count]
+    for run_start, run_end, character in overlapping_runs(unknown_runs, start, end):
+        characters[max(run_start, start) - start:min(run_end, end) - start] = character
+    mask_runs = cache.mask_runs[entry.mask_offset:entry.mask_offset + entry.mask_count]
+    for run_start, run_end in overlapping_runs(mask_runs, start, end):
+        characters[max(run_start, start) - start:min(run_end, end) - start] += 32
+
+    return characters.tobytes()
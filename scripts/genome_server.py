@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""This script run a local genome server (over a Unix socket): each genome is opened only once, and its records and
+sequences are then served to all the scripts of the pipeline (see open_genome in genome_cache)
+The scripts find the server through the GENOME_SERVER environment variable, and directly read the genome cache if
+no server is running
+Only the scripts knowing the key of the server (the GENOME_SERVER_KEY environment variable, in hexadecimal, e.g.
+generated by master_analysis.sh) are answered, as the requests are unpickled by the server
+"""
+import sys
+import os
+import signal
+import threading
+import collections
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+from fasta_functions import selection_file
+from genome_cache import key_variable, server_key, fetch_genome_cache, contains_unknown, clean_windows, \
+    unknown_windows, fetch_cached_codes, fetch_cached_sequence
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Path of the socket of the server (the same as the GENOME_SERVER environment variable of the scripts):
+server_address = str(sys.argv[1])
+
+# The functions the scripts can ask for
+served_functions = {'contains_unknown': contains_unknown,
+                    'clean_windows': clean_windows,
+                    'unknown_windows': unknown_windows,
+                    'fetch_cached_codes': fetch_cached_codes,
+                    'fetch_cached_sequence': fetch_cached_sequence}
+
+# All the genomes opened so far: path -> (modification times of the genome and selection files, GenomeCache)
+genomes = dict()
+# One lock per genome, so that opening a genome never blocks the requests about the others
+genome_locks = collections.defaultdict(threading.Lock)
+genome_locks_lock = threading.Lock()
+
+
+###
+# Fetch the cache of a genome, opened only once (or again if the genome file or its record selection changed since)
+###
+def served_genome(genome_file, check_changes):
+    with genome_locks_lock:
+        genome_lock = genome_locks[genome_file]
+    with genome_lock:
+        if genome_file in genomes and not check_changes:
+            return genomes[genome_file][1]
+        modification_time = tuple(os.path.getmtime(each_file) if os.path.exists(each_file) else None
+                                  for each_file in [genome_file, selection_file(genome_file)])
+        if genome_file not in genomes or genomes[genome_file][0] != modification_time:
+            genomes[genome_file] = (modification_time, fetch_genome_cache(genome_file))
+        return genomes[genome_file][1]
+
+
+###
+# Answer all the requests of a script, until it closes its connection
+# Each request is a (command, genome_file, arguments) tuple (see ask_server in genome_cache)
+###
+def serve(connection):
+    with connection:
+        while True:
+            try:
+                command, genome_file, arguments = connection.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                # Only the opening of a genome (asking its records) check if it changed since it was loaded
+                if command == 'records':
+                    answer = served_genome(genome_file, True).records
+                else:
+                    answer = served_functions[command](served_genome(genome_file, False), *arguments)
+            except Exception as error:
+                answer = error
+            connection.send(answer)
+
+
+# Stopping the server (e.g. kill) must still remove its socket
+signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit())
+
+# The key shared with the scripts (see open_genome)
+authkey = server_key()
+if authkey is None:
+    sys.exit('The key of the genome server must be given in the %s environment variable' % key_variable)
+
+# A socket left by a server which did not stop properly
+if os.path.exists(server_address):
+    os.remove(server_address)
+
+# Only the user running the pipeline may connect to the server, and only the scripts knowing its key are answered
+previous_umask = os.umask(0o077)
+listener = Listener(server_address, family='AF_UNIX', authkey=authkey)
+os.umask(previous_umask)
+try:
+    while True:
+        try:
+            connection = listener.accept()
+        except (AuthenticationError, EOFError, ConnectionError):
+            # A process without the right key (or leaving during the authentication): not answered
+            continue
+        threading.Thread(target=serve, args=(connection,), daemon=True).start()
+finally:
+    listener.close()
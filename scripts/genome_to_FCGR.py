@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""This script compute k-mer frequencies of all the windows of a genome, in a single pass over each record
+"""
+import sys
+import os
+from CGR_functions import windows_FCGR_matrix, sliding_windows_FCGR
+from fasta_functions import read_fasta
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Species genome path (or any fasta file, e.g. a sample):
+species_genome = str(sys.argv[1])
+# Wanted window size:
+window_size = int(sys.argv[2])
+# Wanted k-mer size:
+k_size = int(sys.argv[3])
+# Output file:
+output = str(sys.argv[4])
+# Optional stride in between the start of two windows: if given, the windows overlap and slide along the genome
+if len(sys.argv) > 5:
+    stride = int(sys.argv[5])
+else:
+    stride = 0
+
+
+###
+# Check if parent directory is present, if not create it
+###
+def checking_parent(file_path):
+    # We don't need the file name, so will take everything but the last part
+    parent_directories = '/'.join(file_path.split('/')[0:(len(file_path.split('/')) - 1)])
+    # As we uses parallel, we ended up we one thread doesn't seeing the directory, attempting
+    # creating it, while another just did the same -> error "The file already exist", and stopped everything...
+    try:
+        if not os.path.exists(parent_directories):
+            os.makedirs(parent_directories)
+    except:
+        pass
+
+
+checking_parent(output)
+# Opening concatenated file on top level, to avoid rewriting at each record
+with open(output, 'w') as outfile:
+    # Records are read one at a time: we never have more than one record in memory
+    for record in read_fasta(species_genome):
+        if stride:
+            # Overlapping windows: the counts of each window are updated from the previous one
+            for each_start, each_FCGR in sliding_windows_FCGR(k_size, record.seq, window_size, stride, halving=True):
+                outfile.write(record.id + '_' + str(each_start) + '\t' + '\t'.join(map(str, each_FCGR.tolist()))
+                              + '\t\n')
+            continue
+        for window_starts, FCGRs in windows_FCGR_matrix(k_size, record.seq, window_size, halving=True):
+            # Each window is named as in the scaling samples: record_id_start of the window
+            outfile.writelines(record.id + '_' + str(each_start) + '\t' + '\t'.join(map(str, each_FCGR)) + '\t\n'
+                               for each_start, each_FCGR in zip(window_starts.tolist(), FCGRs.tolist()))
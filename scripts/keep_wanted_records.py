@@ -1,8 +1,10 @@
-"""This script will clean the genome fasta files to only have wanted records
+"""This script will select the wanted records of the genome fasta files
 (only full chromosomes were kept for simplicity)
+The selection is written as a manifest next to the genome, followed by all the fasta readers: the genome itself is
+never rewritten, and changing the selection costs nothing
 """
-from Bio import SeqIO
 import sys
+from fasta_functions import read_fasta, write_selection
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -14,28 +16,16 @@ species_genome = str(sys.argv[1])
 species = '_'.join(str(species_genome.split('/')[-1]).split('_')[:2])
 
 
-###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
-# Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return (records)
-
-
 # Store all the records we which to keep
 with open("../input/wanted_records.txt") as records_ids:
     do_want = [each_id.split()[0].strip() for each_id in records_ids]
 
-records = fetch_fasta(species_genome)
-cleaned_records = [each_record for each_record in records if each_record.id in do_want]
+# All the records of the genome are considered (whatever the previous selection), only their ids are read
+try:
+    records = list(read_fasta(species_genome, with_sequence=False, all_records=True))
+except OSError:
+    print("Cannot open %s, check path!" % species_genome)
+    sys.exit()
+cleaned_records = [each_record.id for each_record in records if each_record.id in do_want]
 
-with open(species_genome, "w") as cleaned_output:
-    SeqIO.write(cleaned_records, cleaned_output, "fasta")
\ No newline at end of file
+write_selection(species_genome, cleaned_records)
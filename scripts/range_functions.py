@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions to store the ranges of all the factors of a species in a single binary file (an
+uncompressed numpy .npz archive, instead of a text file per factor and record): for each factor, the matrix of all its
+ranges, sorted by record, with the offsets of each record, so that the ranges of any (factor, record) are directly found
+"""
+import os
+import fcntl
+import collections
+import numpy as np
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# The ranges of a factor:
+#   - records : dictionary of the number of each record id (the records for which this factor was computed)
+#   - ranges : numpy matrix (int64) of the (start, end) of each range, both included (0-based), sorted by record
+#   - offsets : numpy array of the first line of each record in ranges, plus the end of the last record
+FactorRanges = collections.namedtuple('FactorRanges', ['records', 'ranges', 'offsets'])
+
+
+###
+# Find the path of the range store of a species
+###
+def range_store(species):
+    return '/'.join(['../files/factor_proxies', species + '.npz'])
+
+
+###
+# Build the ranges of a factor from the ranges of each record
+# Input:
+#   - record_ranges : list of (record_id, ranges) of each record, ranges being a list of [start, end] or a numpy matrix
+# Output:
+#   - A FactorRanges
+###
+def build_factor_ranges(record_ranges):
+    all_ranges = [np.asarray(each_ranges, dtype=np.int64).reshape(-1, 2) for _, each_ranges in record_ranges]
+    offsets = np.zeros(len(all_ranges) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(each) for each in all_ranges])
+    if all_ranges:
+        ranges = np.concatenate(all_ranges)
+    else:
+        ranges = np.zeros((0, 2), dtype=np.int64)
+    records = {record_id: each_record for each_record, (record_id, _) in enumerate(record_ranges)}
+    return FactorRanges(records, ranges, offsets)
+
+
+###
+# Fetch the ranges of a record for a factor
+# Inputs:
+#   - factor_ranges : FactorRanges of the factor
+#   - record_id : id of the record
+# Output:
+#   - A numpy matrix of (start, end) of each range (both included), or None if the factor was not computed on the record
+###
+def fetch_record_ranges(factor_ranges, record_id):
+    each_record = factor_ranges.records.get(record_id)
+    if each_record is None:
+        return None
+    return factor_ranges.ranges[factor_ranges.offsets[each_record]:factor_ranges.offsets[each_record + 1]]
+
+
+###
+# Fetch the ranges of a record for all the factors at once
+# Inputs:
+#   - all_factor_ranges : dictionary of the FactorRanges of each factor (see read_range_store)
+#   - record_id : id of the record
+# Output:
+#   - A numpy matrix of (start, end) of all the ranges, one factor after the other
+###
+def fetch_all_record_ranges(all_factor_ranges, record_id):
+    all_record_ranges = [fetch_record_ranges(factor_ranges, record_id) for factor_ranges in all_factor_ranges.values()]
+    return np.concatenate([np.zeros((0, 2), dtype=np.int64)] + [each for each in all_record_ranges if each is not None])
+
+
+###
+# Count the number of nucleotides within ranges (both ends included)
+###
+def ranges_length(ranges):
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    return int(np.maximum(ranges[:, 1] - ranges[:, 0] + 1, 0).sum())
+
+
+###
+# Merge the ranges which are overlapping or next to each other (e.g. [0, 9] and [10, 19] -> [0, 19]), all at once:
+# once sorted by start, a range starts a new merged range only if it begins after the furthest end reached so far
+# Input:
+#   - ranges : list of [start, end] (both included) or numpy matrix, in any order
+# Output:
+#   - A numpy matrix of (start, end) of the merged ranges, sorted
+###
+def merge_ranges(ranges):
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    if not len(ranges):
+        return ranges
+    ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+
+    # Furthest end reached by each range and all the ones before it
+    furthest_ends = np.maximum.accumulate(ranges[:, 1])
+    breaks = np.flatnonzero(ranges[1:, 0] > furthest_ends[:-1] + 1) + 1
+
+    starts = ranges[np.concatenate(([0], breaks)), 0]
+    ends = furthest_ends[np.concatenate((breaks, [len(ranges)])) - 1]
+    return np.column_stack((starts, ends))
+
+
+###
+# Find which factors are in the range store of a species
+###
+def list_factors(store_file):
+    if not os.path.exists(store_file):
+        return list()
+    with np.load(store_file) as store:
+        return sorted(set([each.rsplit('/', 1)[0] for each in store.files]))
+
+
+###
+# Read the ranges of factors from the range store of a species (only the wanted factors are read)
+# Inputs:
+#   - store_file : path to the range store (see range_store)
+#   - factors : list of the wanted factors (by default, all of them)
+# Output:
+#   - A dictionary of the FactorRanges of each factor (the factors not found in the store are missing)
+###
+def read_range_store(store_file, factors=None):
+    all_factor_ranges = dict()
+    if not os.path.exists(store_file):
+        return all_factor_ranges
+
+    with np.load(store_file) as store:
+        stored_factors = set([each.rsplit('/', 1)[0] for each in store.files])
+        for factor in (stored_factors if factors is None else factors):
+            if factor in stored_factors:
+                records = {record_id: each_record
+                           for each_record, record_id in enumerate(store[factor + '/records'].tolist())}
+                all_factor_ranges[factor] = FactorRanges(records, store[factor + '/ranges'],
+                                                         store[factor + '/offsets'])
+    return all_factor_ranges
+
+
+###
+# Write factors in the range store of a species, keeping the other factors already stored
+# As other processes may update the same store at the same time, the store is locked while updating, and written aside
+# then renamed (the processes reading it are never stopped)
+# Inputs:
+#   - store_file : path to the range store (see range_store)
+#   - factor_ranges : dictionary of the FactorRanges of each factor to write (replacing the stored ones)
+#   - removed : list of factors to remove from the store
+###
+def write_range_store(store_file, factor_ranges, removed=()):
+    store_directory = os.path.dirname(store_file)
+    if store_directory and not os.path.exists(store_directory):
+        os.makedirs(store_directory, exist_ok=True)
+
+    with open(store_file + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        all_factor_ranges = read_range_store(store_file)
+        all_factor_ranges.update(factor_ranges)
+        for factor in removed:
+            all_factor_ranges.pop(factor, None)
+
+        arrays = dict()
+        for factor, (records, ranges, offsets) in all_factor_ranges.items():
+            arrays[factor + '/records'] = np.array(sorted(records, key=records.get), dtype=str)
+            arrays[factor + '/ranges'] = ranges
+            arrays[factor + '/offsets'] = offsets
+
+        temporary_file = store_file + '.' + str(os.getpid()) + '.npz'
+        np.savez(temporary_file, **arrays)
+        os.replace(temporary_file, store_file)
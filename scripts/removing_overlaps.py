@@ -3,12 +3,12 @@
 """This script will remove the overlapping nucleotides of two factors from the factor ranges
 Computational time: ranges from 30 minutes (H. sapiens/M. musculus) to instant.
 """
-from Bio import SeqIO
 import sys
-import glob
 import os.path
-import shutil
 from joblib import Parallel, delayed
+from genome_cache import open_genome
+from range_functions import range_store, build_factor_ranges, fetch_record_ranges, merge_ranges, read_range_store, \
+    write_range_store
 
 __author__ = "Titouan Laessle"
 __copyright__ = "Copyright 2017 Titouan Laessle"
@@ -39,40 +39,6 @@ def checking_parent(file_path):
         pass
 
 
-###
-# Extract all the path of files matching a certain pattern in a directory
-###
-def extract_path(files_directory, pattern):
-    return glob.glob(files_directory + pattern)
-
-
-###
-# Fetch a fasta file, and clean it (remove N or n, which stands for "any nucleotides)
-# Note that if the fasta file contain multiple sequences, only the first will have its CGR computed !
-# Input:
-#   - fasta_file : Path to the file containing the sequence one wants the CGR computed on
-###
-def fetch_fasta(fasta_file):
-    # Will only take the first sequence of the fasta file
-    try:
-        records = list(SeqIO.parse(fasta_file, "fasta"))
-    except:
-        print("Cannot open %s, check path!" % fasta_file)
-        sys.exit()
-    return (records)
-
-
-###
-# Extract ranges as a list of ranges
-###
-def extract_ranges(ranges_file_path):
-    ranges = list()
-    with open(ranges_file_path, 'r') as ranges_file:
-        for each_line in ranges_file:
-            ranges.append([int(each_line.strip().split('\t')[0]), int(each_line.strip().split('\t')[1])])
-    return ranges
-
-
 ###
 # Find intersects between two list of ranges (a and b)
 ###
@@ -93,28 +59,23 @@ def intersects(a, b):
         if a_right >= b_left and b_right >= a_left:
             overlap_ranges.append(middle)
 
-    length_of_list = len(overlap_ranges)
-
     # We will also merge two intervals which are next to each other
-    i = 0
-    while i < (length_of_list - 1):
-        if overlap_ranges[i][1] in (overlap_ranges[i + 1][0], overlap_ranges[i + 1][0] - 1):
-            overlap_ranges[i:i + 2] = [[overlap_ranges[i][0], overlap_ranges[i + 1][1]]]
-            length_of_list -= 1
-        else:
-            i += 1
-
-    return overlap_ranges
+    return merge_ranges(overlap_ranges).tolist()
 
 
 ###
 # Clean factor ranges of overlapping ranges
+# Inputs:
+#   - factor_record_ranges : ranges of the record for the factor (see fetch_record_ranges)
+#   - overlap_record_ranges : ranges of the record for the overlapping factors
+# Output:
+#   - The list of clean ranges, or None if any of the factors was not computed on this record
 ###
-def cleaning_ranges(record, factor_directory, overlap_directory):
-    # Catch any missing record : as we will perform this step in parallel, we want to avoid raising errors
-    if os.path.isfile(factor_directory + '/' + record.id) and os.path.isfile(overlap_directory + '/' + record.id):
-        factor_ranges = extract_ranges(factor_directory + '/' + record.id)
-        overlap_ranges = extract_ranges(overlap_directory + '/' + record.id)
+def cleaning_ranges(factor_record_ranges, overlap_record_ranges):
+    # Catch any missing record
+    if factor_record_ranges is not None and overlap_record_ranges is not None:
+        factor_ranges = factor_record_ranges.tolist()
+        overlap_ranges = overlap_record_ranges.tolist()
 
         # As the removing is a multilevel process, we may have some overlap which may have been already erased
         # In this case, we must find which are the overlap to still remove
@@ -150,27 +111,20 @@ def cleaning_ranges(record, factor_directory, overlap_directory):
                     factor_ranges[i] = [bottom[0], bottom[1] - 1]
                     factor_ranges.insert(i + 1, [tail[0] + 1, tail[1]])
 
-        # If we still find some overlaps -> can write them
-        if factor_ranges:
-            # We will now store the clean ranges
-            with open(factor_directory + '/' + record.id, 'w') as clean_file:
-                for each_range in factor_ranges:
-                    clean_file.write('\t'.join([str(each) for each in each_range]) + '\n')
-        # If we lost all ranges, we will simply delete the directory
-        else:
-            if os.path.isdir(factor_directory):
-                shutil.rmtree(factor_directory)
+        return factor_ranges
 
 
 ###
 # Remove the overlapping ranges of factors
 # Inputs:
-#   - genomes_directory : directory of the genomes of species
-#   - main_proxies_directory : main directory of the proxies obtained through the factor_proxies script
-#   - all_factors : list of all wanted factors
-#   - species : name of the wanted species
+#   - to_clean : list of the factors of each level (e.g. [[CDS, RNA], [CDS-RNA]])
+#   - all_factor_ranges : dictionary of the FactorRanges of each factor (see read_range_store), which are cleaned
+# Output:
+#   - The list of the factors which were cleaned
 ###
-def remove_overlap(to_clean, species_proxies_directory):
+def remove_overlap(to_clean, all_factor_ranges):
+    cleaned = set()
+
     # We will perform this for each level (up to *number_of_individual_factors* - 1)
     for each_level in range(len(to_clean) - 1):
         factor_to_clean = to_clean[each_level]
@@ -187,22 +141,36 @@ def remove_overlap(to_clean, species_proxies_directory):
                 overlap = level_to_clean[each_overlap]
                 # We only remove when factor in the overlapping factors
                 if len(list(set(factor.split('-')) & set(overlap.split('-')))) == len(factor.split('-')):
-                    factor_directory = species_proxies_directory + '/' + factor
-                    overlap_directory = species_proxies_directory + '/' + overlap
+                    factor_ranges = all_factor_ranges[factor]
+                    overlap_ranges = all_factor_ranges[overlap]
 
-                    Parallel(n_jobs=n_threads)(delayed(cleaning_ranges)
-                                               (records[each_record], factor_directory, overlap_directory)
-                                               for each_record in range(len(records)))
+                    clean_ranges = Parallel(n_jobs=n_threads)(delayed(cleaning_ranges)
+                                                              (fetch_record_ranges(factor_ranges, record.id),
+                                                               fetch_record_ranges(overlap_ranges, record.id))
+                                                              for record in records)
+                    clean_ranges = {records[each_record].id: clean_ranges[each_record]
+                                    for each_record in range(len(records)) if clean_ranges[each_record] is not None}
+
+                    # The records without overlap keep their ranges, the records which lost all ranges are dropped
+                    record_ids = sorted(factor_ranges.records, key=factor_ranges.records.get)
+                    record_ranges = [(record_id, clean_ranges.get(record_id, fetch_record_ranges(factor_ranges,
+                                                                                                 record_id)))
+                                     for record_id in record_ids]
+                    all_factor_ranges[factor] = build_factor_ranges([each for each in record_ranges
+                                                                     if len(each[1])])
+                    cleaned.add(factor)
+
+    return list(cleaned)
 
 
 # Fetch this species records for the lengths
-records = fetch_fasta(species_genome)
+records = open_genome(species_genome).records
 
-# Directory which lead to the different species proxies
-species_proxies_directory = '/'.join(["../files/factor_proxies", species])
+# All the ranges of this species are read from its range store
+all_factor_ranges = read_range_store(range_store(species))
 
 # Find all the different factors ready
-all_levels = [os.path.basename(each) for each in extract_path(species_proxies_directory + '/', '*')]
+all_levels = sorted(all_factor_ranges)
 
 # How many different levels we have?
 n_levels = max([len(each.split('-')) for each in all_levels])
@@ -212,7 +180,13 @@ to_clean = list()
 for each_level in range(1, n_levels + 1):
     to_clean.append([each for each in all_levels if len(each.split('-')) == each_level])
 
-remove_overlap(to_clean, species_proxies_directory)
+cleaned = remove_overlap(to_clean, all_factor_ranges)
+
+# The clean ranges are stored instead of the previous ones
+# If we lost all ranges of a factor, we will simply remove it
+write_range_store(range_store(species),
+                  {factor: all_factor_ranges[factor] for factor in cleaned if len(all_factor_ranges[factor].ranges)},
+                  [factor for factor in cleaned if not len(all_factor_ranges[factor].ranges)])
 
 # Follow the progression of the analysis
 checking_parent(follow_up)
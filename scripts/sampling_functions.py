@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions shared by the sampling scripts, to randomly draw distinct windows without ever
+building the set of all the possible windows
+"""
+import numpy as np
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+###
+# Randomly draw distinct integers among [0, n_items), using Floyd's algorithm: only n_samples random draws are made,
+# whatever the number of items
+# Inputs:
+#   - n_items : number of items to draw from
+#   - n_samples : number of wanted items (at most n_items)
+# Output:
+#   - A sorted numpy array of the drawn integers
+###
+def sample_distinct(n_items, n_samples):
+    chosen = set()
+    for each_item in range(n_items - n_samples, n_items):
+        draw = int(np.random.randint(0, each_item + 1))
+        chosen.add(each_item if draw in chosen else draw)
+    return np.array(sorted(chosen), dtype=np.int64)
+
+
+###
+# Yield all the integers of [0, n_items) in a random order, drawn one at a time (lazy Fisher-Yates shuffle): only the
+# swapped positions are stored, so that drawing n integers costs O(n) whatever the number of items
+###
+def random_order(n_items):
+    swapped = dict()
+    for each_draw in range(n_items):
+        draw = int(np.random.randint(each_draw, n_items))
+        yield swapped.get(draw, draw)
+        # The position drawn now holds what was at the current position, which will never be drawn again
+        swapped[draw] = swapped.pop(each_draw, each_draw)
+
+
+###
+# Find in which record each window is, given its number among all the windows of a genome (in one vectorized call,
+# through the cumulated number of windows of the records)
+# Inputs:
+#   - window_numbers : numpy array of window numbers among all the windows of the genome
+#   - n_windows : number of windows of each record
+# Output:
+#   - Both the record number and the window number (within its record) of each window, as numpy arrays
+###
+def locate_windows(window_numbers, n_windows):
+    first_windows = np.concatenate(([0], np.cumsum(n_windows, dtype=np.int64)))
+    # Records without any window share their first window number with the next record: the last one is taken
+    record_numbers = np.searchsorted(first_windows, window_numbers, side='right') - 1
+    return record_numbers, window_numbers - first_windows[record_numbers]
+
+
+###
+# Group windows by record, given their sorted record numbers (see locate_windows): the windows of a record then follow
+# each other, so that each group is a slice found at once, whatever the number of records
+# Input:
+#   - record_numbers : sorted numpy array of the record number of each window
+# Output:
+#   - Yield the record number and the slice of its windows, for each record having windows
+###
+def record_groups(record_numbers):
+    if not len(record_numbers):
+        return
+    breaks = np.flatnonzero(np.diff(record_numbers)) + 1
+    firsts = np.concatenate(([0], breaks)).tolist()
+    lasts = np.concatenate((breaks, [len(record_numbers)])).tolist()
+    for first, last in zip(firsts, lasts):
+        yield int(record_numbers[first]), slice(first, last)
+
+
+###
+# Find where are clean windows (without unknown nucleotides), given their rank among all the clean windows of a genome
+# Inputs:
+#   - ranks : sorted numpy array of ranks among all the clean windows of the genome
+#   - n_windows : number of windows of each record
+#   - dirty : sorted numpy array of the windows with unknown nucleotides of each record (see unknown_windows)
+# Output:
+#   - Both the record number and the window number (within its record) of each clean window, as numpy arrays
+###
+def locate_clean_windows(ranks, n_windows, dirty):
+    n_clean = np.array(n_windows, dtype=np.int64) - np.array([len(each) for each in dirty], dtype=np.int64)
+    record_numbers, record_ranks = locate_windows(ranks, n_clean)
+
+    window_numbers = np.empty(len(ranks), dtype=np.int64)
+    # The ranks being sorted, the windows of each record follow each other
+    for each_record, in_record in record_groups(record_numbers):
+        record_dirty = dirty[each_record]
+        # The k-th clean window comes after all the dirty windows having at most k clean windows before them
+        window_numbers[in_record] = record_ranks[in_record] + np.searchsorted(
+            record_dirty - np.arange(len(record_dirty)), record_ranks[in_record], side='right')
+    return record_numbers, window_numbers
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""This script contain the functions to write and read window manifests: the sample windows are only stored as their
+coordinates in the genome, and their sequences are fetched from the genome cache (see genome_cache) when read
+A manifest is a tab-separated file, starting by the path of its genome (relative to the manifest):
+    #genome     path/to/the/genome.fna
+followed by one line per window, giving its id then the record, start and end (0-based, end excluded) of each of its
+pieces, whose sequences are concatenated:
+    window_id   record_1    start_1     end_1   [record_2   start_2     end_2   ...]
+"""
+import os
+import collections
+import numpy
+from fasta_functions import FastaRecord, read_fasta
+from genome_cache import open_genome, fetch_cached_sequence
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+# A piece of a sample window, [start, end) of a record of the genome
+WindowPiece = collections.namedtuple('WindowPiece', ['record', 'start', 'end'])
+
+# A sample window:
+#   - id : name of the window (record_start if scaling, the name of the factor otherwise)
+#   - pieces : list of WindowPiece, the sequence of the window being their concatenated sequences
+SampleWindow = collections.namedtuple('SampleWindow', ['id', 'pieces'])
+
+# Extension of the window manifests (any other sample file is read as a fasta file)
+manifest_extension = '.windows'
+
+
+###
+# Build the piece of a window corresponding to a part of a record
+# Inputs:
+#   - entry : CacheEntry of the record (see open_genome)
+#   - start : first position (0-based) of the piece
+#   - end : position after the last one of the piece
+#       Note: both behave exactly as in a Python slice of the sequence (e.g. negative positions)
+# Output:
+#   - A WindowPiece, whose positions are within the record
+###
+def window_piece(entry, start, end):
+    start, end, _ = slice(start, end).indices(entry.length)
+    return WindowPiece(entry.id, start, max(start, end))
+
+
+###
+# Translate positions of a record into the pieces of consecutive positions (in the order of the positions)
+# Inputs:
+#   - record_id : id of the record
+#   - positions : numpy array of positions within this record
+# Output:
+#   - A list of WindowPiece
+###
+def position_pieces(record_id, positions):
+    if not len(positions):
+        return list()
+    breaks = numpy.flatnonzero(numpy.diff(positions) != 1) + 1
+    starts = positions[numpy.concatenate(([0], breaks))]
+    ends = positions[numpy.concatenate((breaks, [len(positions)])) - 1] + 1
+    return [WindowPiece(record_id, int(start), int(end)) for start, end in zip(starts, ends)]
+
+
+###
+# Cut the concatenation of pieces into consecutive windows
+# Inputs:
+#   - pieces : list of WindowPiece
+#   - window_size : size of the windows
+# Output:
+#   - A list of the pieces of each complete window (what is left at the end is lost)
+###
+def cut_pieces(pieces, window_size):
+    all_windows = list()
+    window_pieces = list()
+    left = window_size
+    for record_id, start, end in pieces:
+        while end - start >= left:
+            window_pieces.append(WindowPiece(record_id, start, start + left))
+            all_windows.append(window_pieces)
+            start += left
+            window_pieces = list()
+            left = window_size
+        if end > start:
+            window_pieces.append(WindowPiece(record_id, start, end))
+            left -= end - start
+    return all_windows
+
+
+###
+# Find the length of a window (sum of the length of its pieces)
+###
+def window_length(window):
+    return sum([each.end - each.start for each in window.pieces])
+
+
+###
+# Write a window manifest
+# Inputs:
+#   - windows : list of SampleWindow
+#   - genome_file : path to the fasta file of the genome the windows come from
+#   - output : path of the manifest
+###
+def write_windows(windows, genome_file, output):
+    manifest_directory = os.path.dirname(output)
+    if manifest_directory and not os.path.exists(manifest_directory):
+        os.makedirs(manifest_directory, exist_ok=True)
+
+    with open(output, 'w') as manifest:
+        manifest.write('#genome\t' + os.path.relpath(genome_file, manifest_directory or '.') + '\n')
+        for window in windows:
+            coordinates = [str(each) for each_piece in window.pieces for each in each_piece]
+            manifest.write('\t'.join([window.id] + coordinates) + '\n')
+
+
+###
+# Find the path of the genome of a window manifest
+###
+def manifest_genome(manifest):
+    with open(manifest, 'r') as manifest_file:
+        header = manifest_file.readline().rstrip('\n').split('\t')
+    if header[0] != '#genome':
+        raise ValueError('%s is not a window manifest (no #genome line)' % manifest)
+    return os.path.join(os.path.dirname(manifest), header[1])
+
+
+###
+# Read the windows of a manifest one at a time, without fetching any sequence
+# Input:
+#   - manifest : path to the window manifest
+# Output:
+#   - Yield a SampleWindow per window, in the order of the manifest
+###
+def read_windows(manifest):
+    with open(manifest, 'r') as manifest_file:
+        for each_line in manifest_file:
+            if each_line.startswith('#'):
+                continue
+            line = each_line.rstrip('\n').split('\t')
+            pieces = [WindowPiece(line[each], int(line[each + 1]), int(line[each + 2]))
+                      for each in range(1, len(line), 3)]
+            yield SampleWindow(line[0], pieces)
+
+
+###
+# Fetch the sequence of a window from the genome cache
+# Inputs:
+#   - genome : GenomeCache (or RemoteGenome) of the genome of the window (see open_genome)
+#   - entries : dictionary of the CacheEntry of each record id
+#   - window : SampleWindow
+# Output:
+#   - The sequence as bytes
+###
+def fetch_window_sequence(genome, entries, window):
+    return b''.join([fetch_cached_sequence(genome, entries[each.record], each.start, each.end)
+                     for each in window.pieces])
+
+
+###
+# Read sample windows one at a time, with their sequences
+# Input:
+#   - sample_file : path to either a window manifest (the sequences are then fetched from the genome cache) or a
+#       fasta file
+# Output:
+#   - Yield a FastaRecord per window, in the order of the file
+###
+def read_samples(sample_file):
+    if not sample_file.endswith(manifest_extension):
+        yield from read_fasta(sample_file)
+        return
+
+    genome = open_genome(manifest_genome(sample_file))
+    entries = {entry.id: entry for entry in genome.records}
+    for window in read_windows(sample_file):
+        window_seq = fetch_window_sequence(genome, entries, window)
+        yield FastaRecord(window.id, window.id, len(window_seq), window_seq)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""Tests of the k-mer counting of the CGR engine (scripts/CGR_functions.py), against the cells reached by playing the
+chaos game one nucleotide at a time
+"""
+import os
+import sys
+import random
+import numpy as np
+import pytest
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+from CGR_functions import nucleotide_codes, kmer_cells, FCGR_from_codes, FCGR_pyramid, max_k_size
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Corner of each nucleotide (x axis, y axis)
+corners = {'A': (0, 0), 'C': (0, 1), 'T': (1, 0), 'G': (1, 1)}
+
+
+###
+# Play the chaos game on a sequence, and find in which cell of the FCGR grid falls each point from the k-th one
+###
+def brute_force_cells(sequence, k_size, halving=False):
+    mini_square = 2 ** k_size
+    x, y = 0.5, 0.5
+    cells = list()
+    for each_position, nucleotide in enumerate(sequence):
+        x = (x + corners[nucleotide][0]) / 2
+        y = (y + corners[nucleotide][1]) / 2
+        if each_position >= k_size - 1:
+            column, line = int(x * mini_square), int(y * mini_square)
+            # The reverse complementary k-mers are joined in the first half of the grid
+            if halving and column >= mini_square // 2:
+                column = mini_square - 1 - column
+            cells.append(column * mini_square + line)
+    return cells
+
+
+def test_kmer_cells_match_chaos_game():
+    generator = random.Random(0)
+    for _ in range(300):
+        sequence = ''.join(generator.choice('ACGT') for _ in range(generator.randrange(30)))
+        k_size = generator.randrange(1, 8)
+        halving = generator.random() < 0.5
+        codes = nucleotide_codes(sequence)
+
+        assert kmer_cells(codes, k_size, halving).tolist() == brute_force_cells(sequence, k_size, halving)
+
+        grid_size = 4 ** k_size // (2 if halving else 1)
+        assert FCGR_from_codes(k_size, codes, halving).tolist() == \
+            np.bincount(np.array(brute_force_cells(sequence, k_size, halving), dtype=np.int64),
+                        minlength=grid_size).tolist()
+
+
+def test_pyramid_matches_each_k_size():
+    generator = random.Random(1)
+    for _ in range(100):
+        codes = nucleotide_codes(''.join(generator.choice('ACGT') for _ in range(generator.randrange(1, 50))))
+        halving = generator.random() < 0.5
+        all_FCGRs = FCGR_pyramid(6, codes, halving)
+        for each_k in range(1, 7):
+            assert all_FCGRs[each_k].tolist() == FCGR_from_codes(each_k, codes, halving).tolist()
+
+
+def test_kmer_cells_refuse_too_big_k_sizes():
+    codes = nucleotide_codes('ACGT' * 10)
+    assert len(kmer_cells(codes, max_k_size)) == 40 - max_k_size + 1
+    for k_size in [0, max_k_size + 1]:
+        with pytest.raises(ValueError):
+            kmer_cells(codes, k_size)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""Tests of the reading of compressed input files (scripts/compressed_files.py): BGZF files written by Bio.bgzf must
+be read and sought exactly as the plain file they come from
+"""
+import os
+import sys
+import gzip
+import random
+from Bio import bgzf
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+import compressed_files
+from compressed_files import compression_type, fetch_bgzf_index, BGZFReader, open_input
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+###
+# Write the same text (a few hundred kb, thus several BGZF blocks) as a plain, gzip and BGZF file
+###
+def compressed_inputs(tmp_path):
+    generator = random.Random(0)
+    text = ''.join(['\t'.join(['NC_%d' % generator.randrange(5), str(each_line),
+                               ''.join(generator.choice('ACGTN') for _ in range(generator.randrange(200)))]) + '\n'
+                    for each_line in range(5000)])
+    files = {each: str(tmp_path / ('table.txt' + extension))
+             for each, extension in [('plain', ''), ('gzip', '.gz'), ('bgzf', '.bgz')]}
+    with open(files['plain'], 'w') as plain:
+        plain.write(text)
+    with gzip.open(files['gzip'], 'wt') as compressed:
+        compressed.write(text)
+    with bgzf.BgzfWriter(files['bgzf'], 'wb') as compressed:
+        compressed.write(text.encode())
+    return text.encode(), files
+
+
+###
+# Read n_bytes from the position of a reader (less if the file ends before)
+###
+def read_bytes(reader, n_bytes):
+    pieces = list()
+    while n_bytes > 0:
+        piece = reader.read(n_bytes)
+        if not piece:
+            break
+        pieces.append(piece)
+        n_bytes -= len(piece)
+    return b''.join(pieces)
+
+
+def test_compression_types(tmp_path):
+    _, files = compressed_inputs(tmp_path)
+
+    assert {each: compression_type(file_path) for each, file_path in files.items()} == \
+        {'plain': 'plain', 'gzip': 'gzip', 'bgzf': 'bgzf'}
+
+
+def test_bgzf_reads_as_plain(tmp_path, monkeypatch):
+    # Small groups of blocks, so that several groups are decompressed in advance
+    monkeypatch.setattr(compressed_files, 'blocks_per_task', 2)
+    content, files = compressed_inputs(tmp_path)
+
+    # The index is built, then read back from the .gzi file
+    index = fetch_bgzf_index(files['bgzf'])
+    assert len(index) > 4
+    assert os.path.exists(files['bgzf'] + '.gzi')
+    assert fetch_bgzf_index(files['bgzf']) == index
+    assert index[-1][1] == len(content)
+
+    for file_path in files.values():
+        with open_input(file_path) as reader:
+            assert reader.read() == content
+        with open_input(file_path, 'r') as reader:
+            assert reader.read() == content.decode()
+
+
+def test_bgzf_seek_round_trips(tmp_path, monkeypatch):
+    monkeypatch.setattr(compressed_files, 'blocks_per_task', 2)
+    content, files = compressed_inputs(tmp_path)
+    generator = random.Random(1)
+
+    with BGZFReader(files['bgzf'], n_threads=2) as reader:
+        for _ in range(300):
+            offset = generator.randrange(len(content) + 10)
+            n_bytes = generator.choice([1, 100, 70000, 300000])
+            # Absolute, relative (often within the current buffer) and from the end of the file
+            whence = generator.choice([os.SEEK_SET, os.SEEK_CUR, os.SEEK_END])
+            if whence == os.SEEK_SET:
+                assert reader.seek(offset) == offset
+            elif whence == os.SEEK_CUR:
+                offset = reader.tell() + generator.randrange(-1000, 1000)
+                reader.seek(offset - reader.tell(), os.SEEK_CUR)
+            else:
+                reader.seek(offset - len(content), os.SEEK_END)
+            offset = max(offset, 0)
+
+            assert reader.tell() == offset
+            assert read_bytes(reader, n_bytes) == content[offset:offset + n_bytes]
+            assert reader.tell() == max(offset, min(offset + n_bytes, len(content)))
+
+    # The line iteration used by the annotation tables, after a seek within the buffer
+    with open_input(files['bgzf']) as reader:
+        reader.readline()
+        position = reader.tell()
+        reader.readline()
+        reader.seek(position)
+        assert reader.read() == content[position:]
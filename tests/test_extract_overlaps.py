@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""Tests of the extraction of the overlaps between factors (scripts/extract_overlaps.py), run as in the pipeline on a
+small genome and range store, against the nucleotides within each combination of factors found one by one
+"""
+import os
+import sys
+import random
+import itertools
+import subprocess
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+from range_functions import build_factor_ranges, fetch_record_ranges, read_range_store, write_range_store
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+# Records of the genome, and their length
+record_lengths = {'NC_1': 150, 'NC_2': 80, 'NC_3': 60}
+
+
+###
+# Run the overlap extraction from a working directory next to the files directory (as in the pipeline)
+###
+def run_extract_overlaps(tmp_path, genome_file):
+    working_directory = tmp_path / 'scripts'
+    working_directory.mkdir(exist_ok=True)
+    environment = dict(os.environ, PYTHONPATH=os.path.join(repository, 'scripts'))
+    environment.pop('GENOME_SERVER', None)
+    subprocess.run([sys.executable, os.path.join(repository, 'scripts', 'extract_overlaps.py'),
+                    genome_file, '2', str(tmp_path / 'follow_up' / 'overlaps.txt')],
+                   cwd=str(working_directory), env=environment, check=True)
+
+
+###
+# Find the ranges of the nucleotides within all the factors of a combination, one nucleotide at a time
+###
+def brute_force_overlap(factor_ranges, combination, record_length):
+    overlap = list()
+    for each in range(record_length):
+        if all(any(start <= each <= end for start, end in factor_ranges[factor]) for factor in combination):
+            if overlap and overlap[-1][1] == each - 1:
+                overlap[-1][1] = each
+            else:
+                overlap.append([each, each])
+    return overlap
+
+
+def test_overlaps_match_brute_force(tmp_path):
+    genome_file = str(tmp_path / 'sp_x_genomes.fna')
+    with open(genome_file, 'w') as genome:
+        for record_id, length in record_lengths.items():
+            genome.write('>' + record_id + '\n' + 'ACGT' * (length // 4) + '\n')
+    store_file = str(tmp_path / 'files' / 'factor_proxies' / 'sp_x.npz')
+    factors = ['CDS', 'RNA', 'TE', 'tandem']
+
+    for seed in range(3):
+        generator = random.Random(seed)
+        # Random ranges (overlapping each other within a factor too), a factor missing from the last record
+        all_ranges = {factor: dict() for factor in factors}
+        for factor in factors:
+            for record_id, length in record_lengths.items():
+                if factor == 'tandem' and record_id == 'NC_3':
+                    continue
+                ranges = list()
+                for _ in range(generator.randrange(6)):
+                    start = generator.randrange(length)
+                    ranges.append([start, min(start + generator.randrange(30), length - 1)])
+                all_ranges[factor][record_id] = sorted(ranges)
+        # An overlap of an earlier run, which does not exist anymore, and uncategorized ranges (left out)
+        write_range_store(store_file, {factor: build_factor_ranges(list(all_ranges[factor].items()))
+                                       for factor in factors})
+        write_range_store(store_file, {'CDS-LCR': build_factor_ranges([('NC_1', [[0, 10]])]),
+                                       'uncategorized': build_factor_ranges([('NC_1', [[0, 149]])])})
+
+        run_extract_overlaps(tmp_path, genome_file)
+
+        stored = read_range_store(store_file)
+        expected = dict()
+        for n_factors in range(2, len(factors) + 1):
+            for combination in itertools.combinations(factors, n_factors):
+                overlap = {record_id: brute_force_overlap({factor: all_ranges[factor].get(record_id, list())
+                                                           for factor in combination}, combination, length)
+                           for record_id, length in record_lengths.items()}
+                overlap = {record_id: ranges for record_id, ranges in overlap.items() if ranges}
+                if overlap:
+                    expected['-'.join(combination)] = overlap
+
+        assert sorted([each for each in stored if '-' in each]) == sorted(expected)
+        for overlap, record_overlaps in expected.items():
+            assert sorted(stored[overlap].records) == sorted(record_overlaps)
+            for record_id, ranges in record_overlaps.items():
+                assert fetch_record_ranges(stored[overlap], record_id).tolist() == ranges
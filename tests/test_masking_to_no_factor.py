@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""Tests of the masking to no factor script (masking/scripts/masking_to_no_factor.py), run as in the pipeline on a
+small genome and range store
+"""
+import os
+import sys
+import subprocess
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+from range_functions import build_factor_ranges, write_range_store
+from window_manifest import read_windows
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+###
+# Run the masking script from a working directory next to the files directory (as in the pipeline)
+###
+def run_masking(tmp_path, factor, window_size, n_samples, genome_file):
+    working_directory = tmp_path / 'masking'
+    working_directory.mkdir(exist_ok=True)
+    output = str(tmp_path / 'samples.windows')
+    environment = dict(os.environ, PYTHONPATH=os.path.join(repository, 'scripts'))
+    environment.pop('GENOME_SERVER', None)
+    subprocess.run([sys.executable, os.path.join(repository, 'masking', 'scripts', 'masking_to_no_factor.py'),
+                    factor, str(window_size), str(n_samples), genome_file, output],
+                   cwd=str(working_directory), env=environment, check=True)
+    return list(read_windows(output))
+
+
+def test_record_without_ranges_is_not_masked(tmp_path):
+    genome_file = str(tmp_path / 'sp_x_genomes.fna')
+    with open(genome_file, 'w') as genome:
+        genome.write('>with_factor\n' + 'ACGT' * 8 + '\n')
+        genome.write('>without_factor\n' + 'ACGTTGCA' * 25 + '\n')
+
+    # Almost all of the first record is within the factor (no window left), the second one has no range at all
+    write_range_store(str(tmp_path / 'files' / 'factor_proxies' / 'sp_x.npz'),
+                      {'TE': build_factor_ranges([('with_factor', [[0, 27]]), ('without_factor', [])])})
+
+    windows = run_masking(tmp_path, 'TE', 10, 5, genome_file)
+
+    assert len(windows) == 5
+    assert len(set([each.pieces[0].start for each in windows])) == 5
+    for each in windows:
+        assert len(each.pieces) == 1
+        assert each.pieces[0].record == 'without_factor'
+        assert each.pieces[0].start % 10 == 0
+        assert each.pieces[0].end - each.pieces[0].start == 10
+
+
+def test_windows_have_window_size_without_factor(tmp_path):
+    genome_file = str(tmp_path / 'sp_x_genomes.fna')
+    with open(genome_file, 'w') as genome:
+        genome.write('>dotted\n' + 'ACGTTGCAAC' * 10 + '\n')
+        genome.write('>blocks\n' + 'ACGTTGCA' * 40 + '\n')
+
+    # Single factor nucleotides every 10 nucleotides, then factor blocks (one at the very end of the record)
+    factor_ranges = {'dotted': [[each, each] for each in range(10, 100, 10)],
+                     'blocks': [[0, 3], [20, 20], [21, 45], [100, 180], [250, 319]]}
+    write_range_store(str(tmp_path / 'files' / 'factor_proxies' / 'sp_x.npz'),
+                      {'TE': build_factor_ranges(list(factor_ranges.items()))})
+
+    windows = run_masking(tmp_path, 'TE', 5, 40, genome_file)
+
+    assert len(windows) == 40
+    for each in windows:
+        assert sum([each_piece.end - each_piece.start for each_piece in each.pieces]) == 5
+        for each_piece in each.pieces:
+            assert each_piece.start < each_piece.end
+            assert not any(start < each_piece.end and each_piece.start <= end
+                           for start, end in factor_ranges[each_piece.record])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""Tests of the range functions (scripts/range_functions.py), against the nucleotides the ranges cover one by one
+"""
+import os
+import sys
+import random
+import numpy as np
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+from range_functions import merge_ranges, ranges_length
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+###
+# Merge ranges one nucleotide at a time: the merged ranges are the runs of consecutive covered nucleotides
+###
+def brute_force_merge(ranges):
+    covered = sorted(set([each for start, end in ranges for each in range(start, end + 1)]))
+    merged = list()
+    for each in covered:
+        if merged and merged[-1][1] == each - 1:
+            merged[-1][1] = each
+        else:
+            merged.append([each, each])
+    return merged
+
+
+def test_merge_ranges_matches_brute_force():
+    generator = random.Random(0)
+    for _ in range(2000):
+        ranges = list()
+        for _ in range(generator.randrange(8)):
+            start = generator.randrange(100)
+            ranges.append([start, start + generator.randrange(15)])
+
+        merged = merge_ranges(ranges)
+        assert merged.shape == (len(merged), 2)
+        assert merged.tolist() == brute_force_merge(ranges)
+        assert ranges_length(merged) == len(set([each for start, end in ranges for each in range(start, end + 1)]))
+
+
+def test_merge_ranges_joins_adjacent_ranges():
+    assert merge_ranges([[10, 19], [0, 9], [25, 30], [21, 23]]).tolist() == [[0, 19], [21, 23], [25, 30]]
+    assert merge_ranges([[0, 50], [5, 10], [20, 60]]).tolist() == [[0, 60]]
+    assert merge_ranges(np.zeros((0, 2), dtype=np.int64)).shape == (0, 2)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Tests of the selection of the wanted records of a genome (see keep_wanted_records): all the readers of a genome only
+give its selected records, the genome itself being kept as it is
+"""
+import os
+import sys
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repository, 'scripts'))
+from fasta_functions import read_fasta, write_selection
+from genome_cache import open_genome
+from window_manifest import read_samples
+
+__author__ = "Titouan Laessle"
+__copyright__ = "Copyright 2017 Titouan Laessle"
+__license__ = "MIT"
+
+
+###
+# Write a genome of three records, only two of them being selected
+###
+def selected_genome(tmp_path):
+    genome_file = str(tmp_path / 'sp_x_genomes.fna')
+    with open(genome_file, 'w') as genome:
+        genome.write('>NC_1 chromosome 1\nACGTACGTAC\nGT\n')
+        genome.write('>NW_2 unplaced scaffold\nTTTTTTTTTT\n')
+        genome.write('>NC_3 chromosome 3\nGGGGCCCC\n')
+    write_selection(genome_file, ['NC_1', 'NC_3'])
+    return genome_file
+
+
+def test_fasta_readers_follow_selection(tmp_path):
+    genome_file = selected_genome(tmp_path)
+
+    assert [each.id for each in read_fasta(genome_file)] == ['NC_1', 'NC_3']
+    # The windowed CGRs read whole genomes as samples
+    assert [(each.id, each.seq) for each in read_samples(genome_file)] == [('NC_1', b'ACGTACGTACGT'),
+                                                                        ('NC_3', b'GGGGCCCC')]
+    # Only the selection is written: the genome still holds all its records
+    assert [each.id for each in read_fasta(genome_file, all_records=True)] == ['NC_1', 'NW_2', 'NC_3']
+
+
+def test_genome_cache_follows_selection(tmp_path, monkeypatch):
+    monkeypatch.delenv('GENOME_SERVER', raising=False)
+    genome_file = selected_genome(tmp_path)
+
+    assert [(each.id, each.length) for each in open_genome(genome_file).records] == [('NC_1', 12), ('NC_3', 8)]